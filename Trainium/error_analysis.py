@@ -1,113 +1,123 @@
 import numpy as np
 import matplotlib.pyplot as plt
-
-# Gate factories with parameterization
-def gate_factory(name, theta=None):
-    if name == "H":
-        return lambda dtype: (1 / np.sqrt(2)) * np.array([[1, 1], [1, -1]], dtype=dtype)
-    elif name == "X":
-        return lambda dtype: np.array([[0, 1], [1, 0]], dtype=dtype)
-    elif name == "Y":
-        return lambda dtype: np.array([[0, -1j], [1j, 0]], dtype=dtype)
-    elif name == "Z":
-        return lambda dtype: np.array([[1, 0], [0, -1]], dtype=dtype)
-    elif name == "Rx":
-        return lambda dtype: np.array([
-            [np.cos(theta/2), -1j*np.sin(theta/2)],
-            [-1j*np.sin(theta/2), np.cos(theta/2)]
-        ], dtype=dtype)
-    elif name == "Ry":
-        return lambda dtype: np.array([
-            [np.cos(theta/2), -np.sin(theta/2)],
-            [np.sin(theta/2), np.cos(theta/2)]
-        ], dtype=dtype)
-    elif name == "Rz":
-        return lambda dtype: np.array([
-            [np.exp(-1j*theta/2), 0],
-            [0, np.exp(1j*theta/2)]
-        ], dtype=dtype)
-
-GATE_NAMES = ["H", "X", "Y", "Z", "Rx", "Ry", "Rz"]
-
-def generate_random_circuit(depth):
-    circuit = []
-    for _ in range(depth):
-        name = np.random.choice(GATE_NAMES)
-        theta = np.random.uniform(0, 2*np.pi) if name.startswith("R") else None
-        circuit.append((name, theta))
-    return circuit
-
-def apply_circuit(circuit, precision="float64"):
+from gate_tables import gate_matrices, random_gates
+from precision_formats import ACCUMULATE_DTYPES, get_format
+from sweep_runner import run_sweep
+
+# A circuit is a pair of arrays: integer gate codes (indices into gate_tables.GATE_NAMES)
+# and rotation angles, drawn in one shot from a np.random.Generator
+def generate_random_circuit(depth, rng=None):
+    rng = np.random.default_rng() if rng is None else rng
+    return random_gates(rng, depth)
+
+def apply_circuit(circuit, precision="float64", accumulate="float64", rounding="nearest", rng=None):
+    codes, thetas = circuit
     if precision == "float64":
-        dtype = np.complex128
-        state = np.array([1.0 + 0j, 0.0 + 0j], dtype=dtype)
-        for name, theta in circuit:
-            gate = gate_factory(name, theta)(dtype)
+        state = np.array([1.0 + 0j, 0.0 + 0j], dtype=np.complex128)
+        for gate in gate_matrices(codes, thetas):
             state = gate @ state
         return state
 
-    elif precision == "float16":
-        real = np.array([1.0, 0.0], dtype=np.float16)
-        imag = np.array([0.0, 0.0], dtype=np.float16)
-        for name, theta in circuit:
-            gate = gate_factory(name, theta)(np.complex128)
-            real_new = gate.real @ real - gate.imag @ imag
-            imag_new = gate.real @ imag + gate.imag @ real
-            real, imag = real_new.astype(np.float16), imag_new.astype(np.float16)
-        return real.astype(np.float64) + 1j * imag.astype(np.float64)
-
-
-depths = range(1, 500)
-num_trials = 100
-
-mean_fidelity_errors = []
-std_fidelity_errors = []
-mean_norm_errors = []
-std_norm_errors = []
-
-for d in depths:
-    fidelity_errors = []
-    norm_errors = []
-
-    for _ in range(num_trials):
-        circuit = generate_random_circuit(d)
-
-        s_fp64 = apply_circuit(circuit, "float64")
-        s_fp16 = apply_circuit(circuit, "float16")
-
-        # Normalize
-        s_fp64 /= np.linalg.norm(s_fp64)
-        s_fp16 /= np.linalg.norm(s_fp16)
-
-        fidelity = np.abs(np.vdot(s_fp64, s_fp16))**2
-        fidelity_errors.append(1 - fidelity)
-        norm_errors.append(np.linalg.norm(s_fp64 - s_fp16))  # direct L2 distance between final states
-
-
-    mean_fidelity_errors.append(np.mean(fidelity_errors))
-    std_fidelity_errors.append(np.std(fidelity_errors) / np.sqrt(num_trials))  # SEM
-
-    mean_norm_errors.append(np.mean(norm_errors))
-    std_norm_errors.append(np.std(norm_errors) / np.sqrt(num_trials))  # SEM
-
-# Plot with error bars (95% confidence interval)
-plt.figure(figsize=(12, 5))
-
-plt.subplot(1, 2, 1)
-plt.errorbar(depths, mean_norm_errors, yerr=1.96*np.array(std_norm_errors), fmt='o-', capsize=3)
-plt.xlabel("Circuit Depth")
-plt.ylabel("Mean Distance (L2)")
-plt.title("L2 Distance Between FP16 and FP64 States")
-plt.grid()
-
-
-plt.subplot(1, 2, 2)
-plt.errorbar(depths, mean_fidelity_errors, yerr=1.96*np.array(std_fidelity_errors), fmt='x-', color='orange', capsize=3)
-plt.xlabel("Circuit Depth")
-plt.ylabel("1 - Fidelity")
-plt.title("Mean Fidelity Error (FP16 vs FP64, 95% CI)")
-plt.grid()
-
-plt.tight_layout()
-plt.show()
-
+    # Emulated formats (see precision_formats): real/imag parts are stored in `precision`
+    # and every gate is computed in the `accumulate` dtype before rounding
+    fmt = get_format(precision)
+    work = ACCUMULATE_DTYPES[accumulate]
+    state = np.array([1.0 + 0j, 0.0 + 0j], dtype=np.complex128)
+    for gate in gate_matrices(codes, thetas, dtype=work):
+        state = fmt.quantize_complex(gate @ state.astype(work), rounding, rng)
+    return state
+
+# Batched engine: all trials evolve together as one (num_trials, 2) state
+def generate_random_circuit_batch(num_trials, depth, rng=None):
+    rng = np.random.default_rng() if rng is None else rng
+    return random_gates(rng, (num_trials, depth))
+
+def sorted_checkpoints(checkpoints, depth):
+    # Snapshots are taken in step order, so checkpoints are returned sorted and deduplicated
+    checkpoints = sorted(set(int(c) for c in checkpoints))
+    if not checkpoints or checkpoints[0] < 1 or checkpoints[-1] > depth:
+        raise ValueError(f"Checkpoints must be a non-empty set of depths in [1, {depth}]")
+    return checkpoints
+
+def apply_circuit_batch(codes, thetas, precision="float64", checkpoints=None,
+                        accumulate="float64", rounding="nearest", rng=None):
+    # With checkpoints, return the state after each listed depth, in increasing order of depth
+    # -> (len(sorted_checkpoints(checkpoints, depth)), num_trials, 2)
+    num_trials, depth = codes.shape
+    record = set(sorted_checkpoints(checkpoints, depth)) if checkpoints is not None else ()
+    snapshots = []
+    fmt = get_format(precision) if precision != "float64" else None
+    work = ACCUMULATE_DTYPES[accumulate] if fmt is not None else np.complex128
+
+    state = np.zeros((num_trials, 2), dtype=np.complex128)
+    state[:, 0] = 1.0
+    for step in range(depth):
+        gates = gate_matrices(codes[:, step], thetas[:, step], dtype=work)
+        state = np.einsum('tij,tj->ti', gates, state.astype(work))
+        if fmt is not None:
+            state = fmt.quantize_complex(state, rounding, rng)
+        if step + 1 in record:
+            snapshots.append(state)
+    return np.stack(snapshots) if checkpoints is not None else state
+
+def state_errors(s_fp64, s_fp16):
+    # 1 - fidelity and L2 distance over the last axis, any leading batch shape
+    s_fp64 = s_fp64 / np.linalg.norm(s_fp64, axis=-1, keepdims=True)
+    s_fp16 = s_fp16 / np.linalg.norm(s_fp16, axis=-1, keepdims=True)
+    fidelity = np.abs(np.sum(s_fp64.conj() * s_fp16, axis=-1))**2
+    return 1 - fidelity, np.linalg.norm(s_fp64 - s_fp16, axis=-1)
+
+def run_trials(qubits, depth, num_trials, rng, precision="float16", checkpoints=None):
+    # Sweep-runner task: errors of num_trials random single-qubit circuits (qubits is always 1 here)
+    codes, thetas = generate_random_circuit_batch(num_trials, depth, rng)
+    s_fp64 = apply_circuit_batch(codes, thetas, "float64", checkpoints=checkpoints)
+    s_fp16 = apply_circuit_batch(codes, thetas, precision, checkpoints=checkpoints)
+    return state_errors(s_fp64, s_fp16)
+
+if __name__ == "__main__":
+    depths = range(1, 500)
+    # "prefix": one circuit per trial grown gate by gate, every depth is a prefix of it (O(D) per trial)
+    # "independent": a fresh circuit for every depth (O(D^2) per trial)
+    sampling = "prefix"
+    low_precision = "float16"  # any name registered in precision_formats, e.g. "bfloat16", "fp8_e4m3"
+    num_trials = 10000  # upper limit per point when sampling stops early
+    chunk_size = 1000
+    rel_tol = None  # e.g. 0.05: stop once the 95% CI of 1 - fidelity is within 5% of its mean
+    workers = None  # process pool size, None for one per CPU
+    cache_dir = "sweep_cache"  # finished chunks are kept here, re-running resumes from them
+
+    if sampling == "prefix":
+        results = run_sweep(run_trials, [(1, max(depths))], num_trials, chunk_size, workers=workers,
+                            cache_dir=cache_dir, rel_tol=rel_tol,
+                            trial_kwargs=dict(precision=low_precision, checkpoints=list(depths)))
+        fidelity_stats, norm_stats = results[(1, max(depths))]
+        mean_fidelity_errors, std_fidelity_errors = fidelity_stats.mean, fidelity_stats.sem()
+        mean_norm_errors, std_norm_errors = norm_stats.mean, norm_stats.sem()
+    else:
+        results = run_sweep(run_trials, [(1, d) for d in depths], num_trials, chunk_size, workers=workers,
+                            cache_dir=cache_dir, rel_tol=rel_tol, trial_kwargs=dict(precision=low_precision))
+        mean_fidelity_errors = [results[(1, d)][0].mean for d in depths]
+        std_fidelity_errors = [results[(1, d)][0].sem() for d in depths]  # SEM
+        mean_norm_errors = [results[(1, d)][1].mean for d in depths]
+        std_norm_errors = [results[(1, d)][1].sem() for d in depths]  # SEM
+
+    # Plot with error bars (95% confidence interval)
+    plt.figure(figsize=(12, 5))
+
+    plt.subplot(1, 2, 1)
+    plt.errorbar(depths, mean_norm_errors, yerr=1.96*np.array(std_norm_errors), fmt='o-', capsize=3)
+    plt.xlabel("Circuit Depth")
+    plt.ylabel("Mean Distance (L2)")
+    plt.title(f"L2 Distance Between {low_precision} and FP64 States")
+    plt.grid()
+
+
+    plt.subplot(1, 2, 2)
+    plt.errorbar(depths, mean_fidelity_errors, yerr=1.96*np.array(std_fidelity_errors), fmt='x-', color='orange', capsize=3)
+    plt.xlabel("Circuit Depth")
+    plt.ylabel("1 - Fidelity")
+    plt.title(f"Mean Fidelity Error ({low_precision} vs FP64, 95% CI)")
+    plt.grid()
+
+    plt.tight_layout()
+    plt.show()
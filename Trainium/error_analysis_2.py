@@ -1,97 +1,168 @@
 import numpy as np
 import matplotlib.pyplot as plt
-from tqdm import tqdm
 import itertools
+from gate_tables import TWO_QUBIT_GATE_NAMES, gate_matrices, is_parametrised, random_gates
+from precision_formats import ACCUMULATE_DTYPES, get_format
+from sweep_runner import run_sweep
+
+# A layer of single-qubit gates is a pair of arrays (codes, thetas), one entry per qubit, with
+# codes indexing gate_tables.GATE_NAMES. An entangling layer is (codes, thetas, pairs) with
+# codes indexing TWO_QUBIT_GATE_NAMES and pairs an (num_pairs, 2) array of qubit indices.
+def entangling_pairs(qubits, layer_index, pairing="brickwork", rng=None):
+    if pairing == "brickwork":
+        start = layer_index % 2
+        return np.array([(a, a + 1) for a in range(start, qubits - 1, 2)], dtype=np.int64).reshape(-1, 2)
+    elif pairing == "random":
+        order = rng.permutation(qubits)
+        return order[:2 * (qubits // 2)].reshape(-1, 2)
+    raise ValueError(f"Unknown pairing: {pairing}")
+
+def generate_random_circuit(qubits, depth, entangler=None, pairing="brickwork", rng=None, gate_set=None):
+    # entangler: None for single-qubit layers only, a name from TWO_QUBIT_GATE_NAMES, or "random".
+    # Each single-qubit layer is then followed by an entangling layer.
+    # gate_set: subset of GATE_NAMES the single-qubit gates are drawn from (default: all).
+    # All gates and angles are drawn in one shot from a np.random.Generator.
+    rng = np.random.default_rng() if rng is None else rng
+    codes, thetas = random_gates(rng, (depth, qubits), gate_set=gate_set)
+    entangling = entangler is not None and qubits >= 2
+    if entangling and entangler == "random":
+        pair_codes, pair_thetas = random_gates(rng, (depth, qubits // 2), two_qubit=True)
+    elif entangling:
+        pair_codes = np.full((depth, qubits // 2), TWO_QUBIT_GATE_NAMES.index(entangler), dtype=np.int8)
+        pair_thetas = np.zeros(pair_codes.shape)
+        if is_parametrised(entangler):
+            pair_thetas = rng.uniform(0, 2*np.pi, size=pair_codes.shape)
 
-# Gate factories
-def gate_factory(name, theta=None):
-    if name == "H":
-        return lambda dtype: (1 / np.sqrt(2)) * np.array([[1, 1], [1, -1]], dtype=dtype)
-    elif name == "X":
-        return lambda dtype: np.array([[0, 1], [1, 0]], dtype=dtype)
-    elif name == "Y":
-        return lambda dtype: np.array([[0, -1j], [1j, 0]], dtype=dtype)
-    elif name == "Z":
-        return lambda dtype: np.array([[1, 0], [0, -1]], dtype=dtype)
-    elif name == "Rx":
-        return lambda dtype: np.array([
-            [np.cos(theta/2), -1j*np.sin(theta/2)],
-            [-1j*np.sin(theta/2), np.cos(theta/2)]
-        ], dtype=dtype)
-    elif name == "Ry":
-        return lambda dtype: np.array([
-            [np.cos(theta/2), -np.sin(theta/2)],
-            [np.sin(theta/2), np.cos(theta/2)]
-        ], dtype=dtype)
-    elif name == "Rz":
-        return lambda dtype: np.array([
-            [np.exp(-1j*theta/2), 0],
-            [0, np.exp(1j*theta/2)]
-        ], dtype=dtype)
-
-GATE_NAMES = ["H", "X", "Y", "Z", "Rx", "Ry", "Rz"]
-
-def generate_random_circuit(qubits, depth):
     circuit = []
-    for _ in range(depth):
-        layer = []
-        for _ in range(qubits):
-            name = np.random.choice(GATE_NAMES)
-            theta = np.random.uniform(0, 2*np.pi) if name.startswith("R") else None
-            layer.append((name, theta))
-        circuit.append(layer)
+    for i in range(depth):
+        circuit.append((codes[i], thetas[i]))
+        if not entangling:
+            continue
+        pairs = entangling_pairs(qubits, i, pairing, rng)
+        if len(pairs):  # odd brickwork layers on two qubits have no pairs
+            circuit.append((pair_codes[i, :len(pairs)], pair_thetas[i, :len(pairs)], pairs))
     return circuit
 
-def kron_gates(gates):
-    result = gates[0]
-    for g in gates[1:]:
-        result = np.kron(result, g)
-    return result
-
-def apply_circuit(circuit, precision="float64"):
-    n = len(circuit[0])  # number of qubits
+def is_entangling(layer):
+    return len(layer) == 3
+
+def apply_gate(state, gate, qubit, n):
+    # Contract a 2x2 gate into one axis of the (2,)*n state; neighbouring axes are merged,
+    # so the state is viewed as (2^qubit, 2, 2^(n-qubit-1)) and never expanded to 2^n x 2^n
+    view = state.reshape(2**qubit, 2, 2**(n - qubit - 1))
+    return np.einsum('ij,ajb->aib', gate, view).reshape(-1)
+
+def apply_two_qubit_gate(state, gate, qubits, n):
+    a, b = qubits
+    if a > b:
+        # swap the gate's tensor legs so that the pair is in ascending qubit order
+        gate = gate.reshape(2, 2, 2, 2).transpose(1, 0, 3, 2).reshape(4, 4)
+        a, b = b, a
+    view = state.reshape(2**a, 2, 2**(b - a - 1), 2, 2**(n - b - 1))
+
+    if np.count_nonzero(gate, axis=1).max() > 1:
+        return np.einsum('ijkl,akblc->aibjc', gate.reshape(2, 2, 2, 2), view).reshape(-1)
+
+    # CNOT, CZ, iSWAP and Rzz have one nonzero per row (a permutation times phases),
+    # so every output slice is a single strided input slice, copied or scaled
+    out = np.empty_like(view)
+    for row, col in enumerate(np.argmax(gate != 0, axis=1)):
+        src = view[:, col >> 1, :, col & 1, :]
+        if gate[row, col] == 1:
+            out[:, row >> 1, :, row & 1, :] = src
+        else:
+            np.multiply(src, gate[row, col], out=out[:, row >> 1, :, row & 1, :])
+    return out.reshape(-1)
+
+def apply_layer(state, layer, n):
+    if is_entangling(layer):
+        codes, thetas, pairs = layer
+        for gate, pair in zip(gate_matrices(codes, thetas, two_qubit=True, dtype=state.dtype), pairs):
+            state = apply_two_qubit_gate(state, gate, pair, n)
+        return state
+    codes, thetas = layer
+    for qubit, gate in enumerate(gate_matrices(codes, thetas, dtype=state.dtype)):
+        state = apply_gate(state, gate, qubit, n)
+    return state
+
+def apply_circuit(circuit, precision="float64", accumulate="float64", rounding="nearest", rng=None,
+                  renorm_every=None):
+    n = len(circuit[0][0])  # number of qubits, the first layer is always a single-qubit layer
     dim = 2 ** n
+    state = np.zeros(dim, dtype=np.complex128)
+    state[0] = 1.0
     if precision == "float64":
-        dtype = np.complex128
-        state = np.zeros(dim, dtype=dtype)
-        state[0] = 1.0
         for layer in circuit:
-            gates = [gate_factory(name, theta)(dtype) for name, theta in layer]
-            full_gate = kron_gates(gates)
-            state = full_gate @ state
+            state = apply_layer(state, layer, n)
         return state
 
-    elif precision == "float16":
-        # simulate real/imag parts in float16
-        real = np.zeros(dim, dtype=np.float16)
-        imag = np.zeros(dim, dtype=np.float16)
-        real[0] = 1.0
-        for layer in circuit:
-            gates = [gate_factory(name, theta)(np.complex128) for name, theta in layer]
-            full_gate = kron_gates(gates)
-            real_new = full_gate.real @ real - full_gate.imag @ imag
-            imag_new = full_gate.real @ imag + full_gate.imag @ real
-            real, imag = real_new.astype(np.float16), imag_new.astype(np.float16)
-        return real.astype(np.float64) + 1j * imag.astype(np.float64)
-
-# Experiment settings
-qubit_counts = range(1, 12)
-depth = 10
-num_trials = 100
-
-mean_fidelity_errors = []
-std_fidelity_errors = []
-mean_distance_errors = []
-std_distance_errors = []
-
-for q in tqdm(qubit_counts, desc="Simulating qubit counts"):
+    # Emulated formats (see precision_formats): real/imag parts are stored in `precision`,
+    # each layer is computed in the `accumulate` dtype and rounded once at its end.
+    # renorm_every: rescale the stored state to unit norm after every k-th layer
+    fmt = get_format(precision)
+    work = ACCUMULATE_DTYPES[accumulate]
+    for i, layer in enumerate(circuit, 1):
+        state = fmt.quantize_complex(apply_layer(state.astype(work), layer, n), rounding, rng)
+        if renorm_every and i % renorm_every == 0:
+            state = state.astype(work)
+            state = fmt.quantize_complex(state / np.linalg.norm(state), rounding, rng)
+    return state
+
+# Product-state fast path: without entangling gates the state stays a product of n qubit
+# states, so each qubit is evolved on its own and stored as n 2-vectors instead of 2^n amplitudes.
+# In low precision this is a different error model, not just a faster route: rounding the n
+# per-qubit 2-vectors is not the same as rounding the 2^n amplitudes of apply_circuit, and the
+# resulting infidelities differ (n=10, depth 10, fp16: 5.9e-7 per-qubit vs 3.9e-7 full state).
+def is_product_circuit(circuit):
+    return not any(is_entangling(layer) for layer in circuit)
+
+def apply_circuit_product(circuit, precision="float64", accumulate="float64", rounding="nearest", rng=None,
+                          renorm_every=None):
+    n = len(circuit[0][0])
+    fmt = get_format(precision) if precision != "float64" else None
+    work = ACCUMULATE_DTYPES[accumulate] if fmt is not None else np.complex128
+    # (depth, n, 2, 2) gates for the whole circuit in one call
+    all_gates = gate_matrices(np.stack([codes for codes, _ in circuit]),
+                              np.stack([thetas for _, thetas in circuit]), dtype=work)
+    states = np.zeros((n, 2), dtype=np.complex128)
+    states[:, 0] = 1.0
+    for i, gates in enumerate(all_gates, 1):
+        states = np.einsum('qij,qj->qi', gates, states.astype(work))
+        if fmt is None:
+            continue
+        # per-qubit amplitudes are stored in the emulated format, rounding once per layer
+        states = fmt.quantize_complex(states, rounding, rng)
+        if renorm_every and i % renorm_every == 0:
+            states = states.astype(work)
+            states = fmt.quantize_complex(states / np.linalg.norm(states, axis=1, keepdims=True), rounding, rng)
+    return states
+
+def product_state_errors(s_fp64, s_fp16):
+    # Global overlap is the product of per-qubit overlaps; for unit vectors |a - b|^2 = 2 - 2 Re<a|b>
+    s_fp64 = s_fp64 / np.linalg.norm(s_fp64, axis=1, keepdims=True)
+    s_fp16 = s_fp16 / np.linalg.norm(s_fp16, axis=1, keepdims=True)
+    overlap = np.prod(np.sum(s_fp64.conj() * s_fp16, axis=1))
+    fidelity = np.abs(overlap)**2
+    distance = np.sqrt(max(2 - 2 * overlap.real, 0.0))
+    return 1 - fidelity, distance
+
+def run_trials(qubits, depth, num_trials, rng, precision="float16", entangler=None, pairing="brickwork",
+               product_fast_path=False):
+    # Sweep-runner task: fidelity errors and L2 distances of num_trials random circuits
     fidelity_errors = []
     distance_errors = []
 
-    for _ in tqdm(range(num_trials), desc=f"Qubits: {q}", leave=False):
-        circuit = generate_random_circuit(q, depth)
+    for _ in range(num_trials):
+        circuit = generate_random_circuit(qubits, depth, entangler, pairing, rng)
+        if product_fast_path and is_product_circuit(circuit):
+            fidelity_error, distance = product_state_errors(apply_circuit_product(circuit, "float64"),
+                                                            apply_circuit_product(circuit, precision, rng=rng))
+            fidelity_errors.append(fidelity_error)
+            distance_errors.append(distance)
+            continue
+
         s_fp64 = apply_circuit(circuit, "float64")
-        s_fp16 = apply_circuit(circuit, "float16")
+        s_fp16 = apply_circuit(circuit, precision, rng=rng)
 
         # Normalize
         s_fp64 /= np.linalg.norm(s_fp64)
@@ -103,30 +174,65 @@ for q in tqdm(qubit_counts, desc="Simulating qubit counts"):
         distance = np.linalg.norm(s_fp64 - s_fp16)
         distance_errors.append(distance)
 
-    mean_fidelity_errors.append(np.mean(fidelity_errors))
-    std_fidelity_errors.append(np.std(fidelity_errors) / np.sqrt(num_trials))
-
-    mean_distance_errors.append(np.mean(distance_errors))
-    std_distance_errors.append(np.std(distance_errors) / np.sqrt(num_trials))
-
-# Plotting
-plt.figure(figsize=(12, 5))
-
-plt.subplot(1, 2, 1)
-plt.errorbar(qubit_counts, mean_distance_errors, yerr=1.96*np.array(std_distance_errors),
-             fmt='o-', capsize=3)
-plt.xlabel("Number of Qubits")
-plt.ylabel("Mean L2 Distance")
-plt.title("FP16 vs FP64: State Distance by Qubit Count")
-plt.grid()
-
-plt.subplot(1, 2, 2)
-plt.errorbar(qubit_counts, mean_fidelity_errors, yerr=1.96*np.array(std_fidelity_errors),
-             fmt='x-', capsize=3, color='orange')
-plt.xlabel("Number of Qubits")
-plt.ylabel("1 - Fidelity")
-plt.title("FP16 vs FP64: Fidelity Error by Qubit Count")
-plt.grid()
-
-plt.tight_layout()
-plt.show()
+    return np.array(fidelity_errors), np.array(distance_errors)
+
+if __name__ == "__main__":
+    # Experiment settings
+    # Full-state cost doubles per qubit (fp64 + fp16 depth-10 trial: ~0.5 s at 16 qubits, ~9 s at 20,
+    # ~5 min at 25, with ~2 GB per worker there). The infidelity varies little between circuits at
+    # large n, so early stopping ends those points after one or two chunks.
+    qubit_counts = range(1, 26)
+    depth = 10
+    num_trials = 100  # upper limit per point when sampling stops early
+    chunk_size = 10
+    rel_tol = 0.05  # stop once the 95% CI of 1 - fidelity is within 5% of its mean, None for all trials
+    workers = None  # process pool size, None for one per CPU
+    cache_dir = "sweep_cache"  # finished chunks are kept here, re-running resumes from them
+    # evolve unentangled circuits as n independent qubits: far cheaper at large n, but reports the
+    # per-qubit-storage error model, not the full-state one
+    product_fast_path = False
+    low_precision = "float16"  # any name registered in precision_formats, e.g. "bfloat16", "fp8_e4m3"
+    entangler = None  # None, "CNOT", "CZ", "iSWAP", "Rzz" or "random"
+    pairing = "brickwork"  # or "random"
+
+    results = run_sweep(run_trials, [(q, depth) for q in qubit_counts], num_trials, chunk_size,
+                        workers=workers, cache_dir=cache_dir, rel_tol=rel_tol, desc="Simulating qubit counts",
+                        trial_kwargs=dict(precision=low_precision, entangler=entangler, pairing=pairing,
+                                          product_fast_path=product_fast_path))
+
+    mean_fidelity_errors = []
+    std_fidelity_errors = []
+    mean_distance_errors = []
+    std_distance_errors = []
+
+    for q in qubit_counts:
+        fidelity_stats, distance_stats = results[(q, depth)]
+
+        mean_fidelity_errors.append(fidelity_stats.mean)
+        std_fidelity_errors.append(fidelity_stats.sem())
+
+        mean_distance_errors.append(distance_stats.mean)
+        std_distance_errors.append(distance_stats.sem())
+
+    # Plotting
+    plt.figure(figsize=(12, 5))
+
+    plt.subplot(1, 2, 1)
+    plt.errorbar(qubit_counts, mean_distance_errors, yerr=1.96*np.array(std_distance_errors),
+                 fmt='o-', capsize=3)
+    plt.xlabel("Number of Qubits")
+    plt.ylabel("Mean L2 Distance")
+    model = " (per-qubit storage)" if product_fast_path and entangler is None else ""
+    plt.title(f"{low_precision} vs FP64: State Distance by Qubit Count{model}")
+    plt.grid()
+
+    plt.subplot(1, 2, 2)
+    plt.errorbar(qubit_counts, mean_fidelity_errors, yerr=1.96*np.array(std_fidelity_errors),
+                 fmt='x-', capsize=3, color='orange')
+    plt.xlabel("Number of Qubits")
+    plt.ylabel("1 - Fidelity")
+    plt.title(f"{low_precision} vs FP64: Fidelity Error by Qubit Count{model}")
+    plt.grid()
+
+    plt.tight_layout()
+    plt.show()
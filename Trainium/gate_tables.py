@@ -0,0 +1,82 @@
+import numpy as np
+
+# Gate tables for the error-analysis scripts.
+# Circuits are stored as integer gate codes (indices into GATE_NAMES or TWO_QUBIT_GATE_NAMES)
+# plus a theta array of the same shape. Fixed gates are gathered from a precomputed table and
+# rotations are built for whole theta arrays at once, so no gate goes through Python on its own.
+
+GATE_NAMES = ["H", "X", "Y", "Z", "Rx", "Ry", "Rz"]
+# Two-qubit gates act on |q_a q_b>, the first qubit of the pair being the more significant one
+TWO_QUBIT_GATE_NAMES = ["CNOT", "CZ", "iSWAP", "Rzz"]
+
+FIXED_GATES = {
+    "H": (1 / np.sqrt(2)) * np.array([[1, 1], [1, -1]]),
+    "X": np.array([[0, 1], [1, 0]]),
+    "Y": np.array([[0, -1j], [1j, 0]]),
+    "Z": np.array([[1, 0], [0, -1]]),
+    "CNOT": np.array([[1, 0, 0, 0], [0, 1, 0, 0], [0, 0, 0, 1], [0, 0, 1, 0]]),
+    "CZ": np.diag([1, 1, 1, -1]),
+    "iSWAP": np.array([[1, 0, 0, 0], [0, 0, 1j, 0], [0, 1j, 0, 0], [0, 0, 0, 1]]),
+}
+
+def is_parametrised(name):
+    return name.startswith("R")
+
+def rotation_matrices(name, thetas):
+    # (..., 2, 2) or (..., 4, 4) rotation gates for a whole array of angles
+    thetas = np.asarray(thetas, dtype=np.float64)
+    c, s = np.cos(thetas/2), np.sin(thetas/2)
+    if name == "Rzz":
+        gates = np.zeros(thetas.shape + (4, 4), dtype=np.complex128)
+        phase = np.exp(-1j*thetas/2)
+        gates[..., 0, 0] = gates[..., 3, 3] = phase
+        gates[..., 1, 1] = gates[..., 2, 2] = phase.conj()
+        return gates
+    gates = np.zeros(thetas.shape + (2, 2), dtype=np.complex128)
+    if name == "Rx":
+        gates[..., 0, 0] = gates[..., 1, 1] = c
+        gates[..., 0, 1] = gates[..., 1, 0] = -1j*s
+    elif name == "Ry":
+        gates[..., 0, 0] = gates[..., 1, 1] = c
+        gates[..., 0, 1] = -s
+        gates[..., 1, 0] = s
+    elif name == "Rz":
+        gates[..., 0, 0] = np.exp(-1j*thetas/2)
+        gates[..., 1, 1] = np.exp(1j*thetas/2)
+    else:
+        raise ValueError(f"Unknown rotation gate: {name}")
+    return gates
+
+def gate_table(names, size):
+    # Fixed gates in their slots, parametrised slots left zero and filled per theta
+    table = np.zeros((len(names), size, size), dtype=np.complex128)
+    for code, name in enumerate(names):
+        if not is_parametrised(name):
+            table[code] = FIXED_GATES[name]
+    return table
+
+SINGLE_QUBIT_TABLE = gate_table(GATE_NAMES, 2)
+TWO_QUBIT_TABLE = gate_table(TWO_QUBIT_GATE_NAMES, 4)
+
+def gate_matrices(codes, thetas, two_qubit=False, dtype=np.complex128):
+    # codes/thetas of any shape -> gate matrices of shape codes.shape + (2, 2) (or (4, 4))
+    names = TWO_QUBIT_GATE_NAMES if two_qubit else GATE_NAMES
+    table = TWO_QUBIT_TABLE if two_qubit else SINGLE_QUBIT_TABLE
+    codes = np.asarray(codes)
+    gates = table[codes]
+    for code, name in enumerate(names):
+        if is_parametrised(name):
+            mask = codes == code
+            if mask.any():
+                gates[mask] = rotation_matrices(name, np.asarray(thetas)[mask])
+    return gates.astype(dtype, copy=False)
+
+def random_gates(rng, shape, two_qubit=False, gate_set=None):
+    # One-shot draw of gate codes and angles; angles of fixed gates are set to zero.
+    # gate_set restricts the draw to a subset of the gate names.
+    names = TWO_QUBIT_GATE_NAMES if two_qubit else GATE_NAMES
+    allowed = np.array([names.index(name) for name in (gate_set or names)], dtype=np.int8)
+    codes = allowed[rng.integers(len(allowed), size=shape, dtype=np.int8)]  # int8 keeps the draws of earlier sweeps
+    thetas = rng.uniform(0, 2*np.pi, size=shape)
+    parametrised = np.array([is_parametrised(name) for name in names])
+    return codes, np.where(parametrised[codes], thetas, 0.0)
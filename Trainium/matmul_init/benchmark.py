@@ -0,0 +1,218 @@
+"""
+Shape-sweeping benchmark and autotuner for the NKI matmul kernel variants.
+
+Every variant from matrix_multiplication_nki_kernels is timed over a grid of (M, K, N) and
+dtypes, with warm-up runs and the median of repeated runs, and reported as TFLOP/s and
+modelled HBM traffic. The fastest variant and tile parameters per shape are kept in a JSON
+table, which dispatch() uses to pick the kernel for a call.
+
+Without torch_xla or the NKI kernels, every variant is replaced by a torch-CPU stand-in with
+the same tiling (fp32 accumulation over K tiles, output in the input dtype), so the harness,
+the table and dispatch can be run and checked without hardware. Entries are keyed by backend
+so stand-in timings never mix with device timings.
+"""
+
+import itertools
+import json
+import os
+import time
+
+import numpy as np
+import torch
+
+from reference_cache import ReferenceCache
+
+try:
+    from torch_xla.core import xla_model as xm
+    import matrix_multiplication_nki_kernels as nki_kernels
+except ImportError:
+    xm = nki_kernels = None
+
+BACKEND = "nki" if nki_kernels is not None else "cpu"
+TABLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "matmul_tuning.json")
+
+TILE_M, TILE_K, TILE_N = 128, 128, 512  # partition dim, contraction tile, PSUM free dim
+DTYPES = {"bfloat16": torch.bfloat16, "float16": torch.float16, "float32": torch.float32}
+
+class KernelVariant:
+    # block(M, K, N, params) gives the (M, K, N) extent of the output block a kernel keeps
+    # on chip; it is used both for the stand-in tiling and for the traffic model
+    def __init__(self, name, kernel_name, block, param_grid=None, max_shape=None):
+        self.name = name
+        self.kernel_name = kernel_name
+        self.block = block
+        self.param_grid = param_grid or {}
+        self.max_shape = max_shape
+
+    def configs(self):
+        keys = sorted(self.param_grid)
+        for values in itertools.product(*(self.param_grid[key] for key in keys)):
+            yield dict(zip(keys, values))
+
+    def supports(self, M, K, N, params):
+        if self.max_shape and any(size > limit for size, limit in zip((M, K, N), self.max_shape)):
+            return False
+        block_m, block_k, block_n = self.block(M, K, N, params)
+        return M % block_m == 0 and K % block_k == 0 and N % block_n == 0
+
+    def kernel(self):
+        if nki_kernels is not None:
+            return getattr(nki_kernels, self.kernel_name)
+        return lambda lhsT, rhs, **params: blocked_matmul(lhsT, rhs, *self.block(lhsT.shape[1], lhsT.shape[0],
+                                                                                  rhs.shape[1], params))
+
+VARIANTS = [
+    # a single tile, so only shapes that fit one PSUM tile
+    KernelVariant("basic", "nki_matmul_basic_", lambda M, K, N, p: (M, K, N), max_shape=(TILE_M, TILE_K, TILE_N)),
+    KernelVariant("tiled", "nki_matmul_tiled_", lambda M, K, N, p: (TILE_M, TILE_K, TILE_N)),
+    # the lhs column strip is loaded once per M tile and reused for every N tile
+    KernelVariant("hoist_load", "nki_matmul_hoist_load_", lambda M, K, N, p: (TILE_M, TILE_K, N)),
+    KernelVariant("block_free_dimension", "nki_matmul_block_free_dimension_",
+                  lambda M, K, N, p: (2 * TILE_M, TILE_K, 2 * TILE_N)),
+    KernelVariant("fully_optimized", "nki_matmul_fully_optimized_",
+                  lambda M, K, N, p: (p["TILES_IN_BLOCK_M"] * TILE_M, p["TILES_IN_BLOCK_K"] * TILE_K,
+                                      p["TILES_IN_BLOCK_N"] * TILE_N),
+                  {"TILES_IN_BLOCK_M": [2, 4, 8, 16], "TILES_IN_BLOCK_N": [1, 2, 4], "TILES_IN_BLOCK_K": [2, 4, 8]}),
+]
+
+def get_variant(name):
+    for variant in VARIANTS:
+        if variant.name == name:
+            return variant
+    raise ValueError(f"Unknown matmul variant: {name}")
+
+def get_device():
+    return xm.xla_device() if xm is not None else torch.device("cpu")
+
+def synchronize(device):
+    if xm is not None and device.type == "xla":
+        xm.mark_step()
+        xm.wait_device_ops()
+
+def blocked_matmul(lhsT, rhs, block_m, block_k, block_n):
+    # CPU stand-in: (K, M).T @ (K, N) computed block by block, accumulating K blocks in fp32
+    K, M = lhsT.shape
+    N = rhs.shape[1]
+    out = torch.empty((M, N), dtype=lhsT.dtype)
+    for m in range(0, M, block_m):
+        for n in range(0, N, block_n):
+            acc = torch.zeros((min(block_m, M - m), min(block_n, N - n)), dtype=torch.float32)
+            for k in range(0, K, block_k):
+                acc += lhsT[k:k + block_k, m:m + block_m].float().T @ rhs[k:k + block_k, n:n + block_n].float()
+            out[m:m + block_m, n:n + block_n] = acc
+    return out
+
+def hbm_bytes(M, K, N, block, itemsize):
+    # Operands are re-read once per output block that needs them: lhs once per N block,
+    # rhs once per M block; the output is written once
+    block_m, _, block_n = block
+    return itemsize * (M * K * -(-N // block_n) + K * N * -(-M // block_m) + M * N)
+
+def table_key(M, K, N, dtype, backend=BACKEND):
+    return f"{backend}:{dtype}:{M}x{K}x{N}"
+
+def load_table(path=TABLE_PATH):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+def save_table(table, path=TABLE_PATH):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(table, f, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+def time_kernel(kernel, lhsT, rhs, params, device, warmup=2, repeats=10):
+    # Median wall time of one call; warm-up runs absorb compilation and first-touch costs
+    for _ in range(warmup):
+        output = kernel(lhsT, rhs, **params)
+    synchronize(device)
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        output = kernel(lhsT, rhs, **params)
+        synchronize(device)
+        times.append(time.perf_counter() - start)
+    return sorted(times)[len(times) // 2], output
+
+def benchmark_shape(M, K, N, dtype="bfloat16", variants=None, warmup=2, repeats=10, seed=0, check=True,
+                    cache=None):
+    # One result dict per supported (variant, params); configurations whose output does not
+    # match the torch reference (same tolerances as example.py) are marked and never selected
+    device = get_device()
+    generator = torch.Generator().manual_seed(seed)
+    lhs = torch.rand((M, K), generator=generator).to(DTYPES[dtype])
+    rhs = torch.rand((K, N), generator=generator).to(DTYPES[dtype])
+    if check:
+        cache = cache or ReferenceCache()
+        reference = cache.get_or_compute("matmul_fp32", [(M, K), (K, N)], dtype, seed,
+                                         lambda: torch.matmul(lhs.float(), rhs.float()))
+    lhsT, rhs = lhs.T.contiguous().to(device), rhs.to(device)
+    itemsize = torch.finfo(DTYPES[dtype]).bits // 8
+
+    results = []
+    for variant in variants or VARIANTS:
+        kernel = variant.kernel()
+        for params in variant.configs():
+            if not variant.supports(M, K, N, params):
+                continue
+            seconds, output = time_kernel(kernel, lhsT, rhs, params, device, warmup, repeats)
+            traffic = hbm_bytes(M, K, N, variant.block(M, K, N, params), itemsize)
+            results.append({
+                "variant": variant.name,
+                "params": params,
+                "seconds": seconds,
+                "tflops": 2 * M * K * N / seconds / 1e12,
+                "hbm_bytes": traffic,
+                "hbm_gbps": traffic / seconds / 1e9,
+                "correct": not check or np.allclose(reference, output.to("cpu").float().numpy(), atol=1e-4, rtol=1e-2),
+            })
+    return results
+
+def tune(shapes, dtypes=("bfloat16",), variants=None, warmup=2, repeats=10, path=TABLE_PATH, force=False):
+    # Benchmarks every (shape, dtype) not yet in the table and records the fastest correct
+    # configuration; the table is written after every shape, so an interrupted sweep resumes
+    table = load_table(path)
+    for (M, K, N), dtype in itertools.product(shapes, dtypes):
+        key = table_key(M, K, N, dtype)
+        if key in table and not force:
+            continue
+        results = [r for r in benchmark_shape(M, K, N, dtype, variants, warmup, repeats) if r["correct"]]
+        if not results:
+            continue
+        best = min(results, key=lambda r: r["seconds"])
+        table[key] = {k: best[k] for k in ("variant", "params", "seconds", "tflops", "hbm_gbps")}
+        save_table(table, path)
+    return table
+
+def select_kernel(M, K, N, dtype="bfloat16", table=None):
+    # Fastest known (kernel, params) for the shape; untuned shapes fall back to the most
+    # optimised variant that supports them with its first tile configuration
+    table = load_table() if table is None else table
+    entry = table.get(table_key(M, K, N, dtype))
+    if entry is not None:
+        return get_variant(entry["variant"]).kernel(), entry["params"]
+    for variant in reversed(VARIANTS):
+        for params in variant.configs():
+            if variant.supports(M, K, N, params):
+                return variant.kernel(), params
+    raise ValueError(f"No matmul variant supports shape {M}x{K}x{N}")
+
+def dispatch(lhsT, rhs, table=None):
+    # Drop-in for calling a variant directly: nki_func(lhs.T, rhs)
+    K, M = lhsT.shape
+    dtype = str(lhsT.dtype).replace("torch.", "")
+    kernel, params = select_kernel(M, K, rhs.shape[1], dtype, table)
+    return kernel(lhsT, rhs, **params)
+
+if __name__ == "__main__":
+    shapes = [(64, 128, 512)] + list(itertools.product([512, 2048], [512, 1024], [512, 2048]))
+    print(f"backend: {BACKEND}")
+    for M, K, N in shapes:
+        for r in benchmark_shape(M, K, N, repeats=3):
+            print(f"{M:>5}x{K:>5}x{N:>5} {r['variant']:<21} {str(r['params']):<62} "
+                  f"{r['tflops']:8.4f} TFLOP/s {r['hbm_gbps']:8.2f} GB/s {'ok' if r['correct'] else 'MISMATCH'}")
+    table = tune(shapes, repeats=3)
+    for key, entry in sorted(table.items()):
+        print(f"{key:<32} -> {entry['variant']} {entry['params']} ({entry['tflops']:.4f} TFLOP/s)")
@@ -0,0 +1,126 @@
+"""
+Complex matmul on top of the real matmul kernels.
+
+Complex operands are kept as split (real, imag) pairs, as in the error-analysis simulators.
+The 4M form needs four real products; the 3M (Gauss) form needs three:
+
+    T1 = Ar @ Br,  T2 = Ai @ Bi,  T3 = (Ar + Ai) @ (Br + Bi)
+    real = T1 - T2,  imag = T3 - T1 - T2
+
+Inputs go to the kernels in bf16 and products are accumulated and combined in fp32. 3M
+pays for the saved product with a slightly larger error: Ar + Ai and Br + Bi are rounded to
+bf16 once more, and the imaginary part is a difference of larger terms.
+"""
+
+import time
+
+import numpy as np
+import torch
+
+from benchmark import BACKEND, get_device, load_table, select_kernel, synchronize
+
+METHODS = ("3m", "4m")
+
+def make_matmul(table=None):
+    # bf16 x bf16 -> fp32. On the device the tiled kernels take lhs transposed and accumulate
+    # in fp32 PSUM, but they write the result back in the input dtype. The kernels are 2-D, so
+    # a batch (..., M, K) @ (..., K, N) goes through them one product at a time; shapes that
+    # no variant supports fall back to torch.matmul on the same device. The tuning table is
+    # read once, and the kernel for each (M, K, N, dtype) is looked up on its first use only,
+    # so neither happens inside a timed call after a warm-up.
+    if BACKEND != "nki":
+        return lambda lhs, rhs: torch.matmul(lhs.float(), rhs.float())
+    table = load_table() if table is None else table
+    kernels = {}
+
+    def matmul(lhs, rhs):
+        (M, K), N = lhs.shape[-2:], rhs.shape[-1]
+        key = (M, K, N, str(lhs.dtype).replace("torch.", ""))
+        if key not in kernels:
+            try:
+                kernels[key] = select_kernel(*key, table)
+            except ValueError:
+                kernels[key] = None
+        if kernels[key] is None:
+            return torch.matmul(lhs.float(), rhs.float())
+        return kernel_matmul(lhs, rhs, *kernels[key])
+    return matmul
+
+def default_matmul(lhs, rhs, table=None):
+    # One-off product; for repeated calls build the matmul once with make_matmul
+    return make_matmul(table)(lhs, rhs)
+
+def kernel_matmul(lhs, rhs, kernel, params):
+    (M, K), N = lhs.shape[-2:], rhs.shape[-1]
+    if lhs.dim() == 2 and rhs.dim() == 2:
+        return kernel(lhs.T.contiguous(), rhs, **params).float()
+    batch = torch.broadcast_shapes(lhs.shape[:-2], rhs.shape[:-2])
+    lhs = lhs.expand(batch + (M, K)).reshape(-1, M, K)
+    rhs = rhs.expand(batch + (K, N)).reshape(-1, K, N)
+    products = [kernel(l.T.contiguous(), r, **params).float() for l, r in zip(lhs, rhs)]
+    return torch.stack(products).reshape(batch + (M, N))
+
+def complex_matmul(a, b, method="3m", dtype=torch.bfloat16, matmul=None):
+    # a, b: (real, imag) pairs of shape (..., M, K) and (..., K, N); returns fp32 (real, imag)
+    matmul = matmul or make_matmul()
+    a_re, a_im = (x.to(dtype) for x in a)
+    b_re, b_im = (x.to(dtype) for x in b)
+    if method == "4m":
+        real = matmul(a_re, b_re) - matmul(a_im, b_im)
+        imag = matmul(a_re, b_im) + matmul(a_im, b_re)
+        return real, imag
+    if method != "3m":
+        raise ValueError(f"Unknown complex matmul method: {method}")
+    t1 = matmul(a_re, b_re)
+    t2 = matmul(a_im, b_im)
+    t3 = matmul((a[0].float() + a[1].float()).to(dtype), (b[0].float() + b[1].float()).to(dtype))
+    return t1 - t2, t3 - t1 - t2
+
+def split(z):
+    return torch.from_numpy(np.ascontiguousarray(z.real)), torch.from_numpy(np.ascontiguousarray(z.imag))
+
+def random_unitaries(rng, batch, size):
+    # Haar-random unitaries from the QR decomposition of complex Gaussian matrices
+    z = (rng.standard_normal((batch, size, size)) + 1j * rng.standard_normal((batch, size, size))) / np.sqrt(2)
+    q, r = np.linalg.qr(z)
+    d = np.diagonal(r, axis1=-2, axis2=-1)
+    return q * (d / np.abs(d))[..., None, :]
+
+def compare_methods(batch=64, size=256, repeats=10, seed=0, dtype=torch.bfloat16, matmul=None,
+                    device=None):
+    # Unitary composition U @ V for a batch of random unitaries: relative Frobenius error
+    # against the complex128 product, and throughput in complex multiply-accumulates per second.
+    # The warm-up call also does the kernel lookups, so the timed calls only run products.
+    device = device or get_device()
+    matmul = matmul or make_matmul()
+    rng = np.random.default_rng(seed)
+    u, v = random_unitaries(rng, batch, size), random_unitaries(rng, batch, size)
+    reference = u @ v
+    a = tuple(x.to(device) for x in split(u))
+    b = tuple(x.to(device) for x in split(v))
+    macs = batch * size**3
+
+    rows = []
+    for method in METHODS:
+        complex_matmul(a, b, method, dtype, matmul)  # warm-up
+        synchronize(device)
+        times = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            real, imag = complex_matmul(a, b, method, dtype, matmul)
+            synchronize(device)
+            times.append(time.perf_counter() - start)
+        seconds = sorted(times)[len(times) // 2]
+        result = real.cpu().double().numpy() + 1j * imag.cpu().double().numpy()
+        error = np.linalg.norm(result - reference, axis=(-2, -1)) / np.linalg.norm(reference, axis=(-2, -1))
+        rows.append({"method": method, "real_matmuls": 3 if method == "3m" else 4, "seconds": seconds,
+                     "complex_macs_per_second": macs / seconds,
+                     "mean_rel_error": float(error.mean()), "max_rel_error": float(error.max())})
+    return rows
+
+if __name__ == "__main__":
+    for size in [2, 4, 64, 256]:
+        for row in compare_methods(batch=max(1, 2**20 // size**2), size=size):
+            print(f"n={size:<4} {row['method']} ({row['real_matmuls']} matmuls) {row['seconds']*1e3:8.2f} ms "
+                  f"{row['complex_macs_per_second']:10.3e} cMAC/s  rel. error mean {row['mean_rel_error']:.2e} "
+                  f"max {row['max_rel_error']:.2e}")
@@ -5,9 +5,11 @@ PyTorch implementation for matrix multiplication NKI tutorial.
 
 """
 
+import numpy as np
 import torch
 from torch_xla.core import xla_model as xm
 
+from reference_cache import ReferenceCache
 from matrix_multiplication_nki_kernels import nki_matmul_basic_, nki_matmul_tiled_, nki_matmul_hoist_load_, nki_matmul_block_free_dimension_, nki_matmul_fully_optimized_
 
 if __name__ == "__main__":
@@ -16,19 +18,26 @@ if __name__ == "__main__":
   device = xm.xla_device()
   cpu = torch.device('cpu')
 
+  # Inputs are drawn on the CPU from a seeded generator, so the torch references are
+  # reproducible and can be reused from the reference cache across runs
+  seed = 0
+  generator = torch.Generator().manual_seed(seed)
+  cache = ReferenceCache()
+
   # Test the small workload with basic kernel
-  lhs_small = torch.rand((64, 128), dtype=torch.bfloat16, device=device)
-  rhs_small = torch.rand((128, 512), dtype=torch.bfloat16, device=device)
+  lhs_small = torch.rand((64, 128), dtype=torch.bfloat16, generator=generator).to(device)
+  rhs_small = torch.rand((128, 512), dtype=torch.bfloat16, generator=generator).to(device)
 
   # Run NKI kernel
   output_small = nki_matmul_basic_(lhs_small.T, rhs_small)
 
   # Run torch reference
-  output_small_torch = torch.matmul(lhs_small, rhs_small)
+  output_small_torch = cache.get_or_compute("matmul_small", [(64, 128), (128, 512)], "bfloat16", seed,
+                                            lambda: torch.matmul(lhs_small, rhs_small).to(device=cpu))
 
   # Compare results
   print("Checking correctness of nki_matmul_basic")
-  if torch.allclose(output_small_torch, output_small, atol=1e-4, rtol=1e-2):
+  if np.allclose(output_small_torch, output_small.to(device=cpu).float().numpy(), atol=1e-4, rtol=1e-2):
     print("NKI and Torch match")
   else:
     print("NKI and Torch differ")
@@ -36,16 +45,18 @@ if __name__ == "__main__":
 
   # NKI_EXAMPLE_22_BEGIN
   # Test the large workload with tiled kernels
-  lhs = torch.rand((4096, 1024), dtype=torch.bfloat16, device=device)
-  rhs = torch.rand((1024, 2048), dtype=torch.bfloat16, device=device)
+  generator.manual_seed(seed)
+  lhs = torch.rand((4096, 1024), dtype=torch.bfloat16, generator=generator).to(device)
+  rhs = torch.rand((1024, 2048), dtype=torch.bfloat16, generator=generator).to(device)
 
-  # Run torch reference
-  output_torch = torch.matmul(lhs, rhs).to(device=cpu)
+  # Run torch reference (memory-mapped from the cache after the first run)
+  output_torch = cache.get_or_compute("matmul", [(4096, 1024), (1024, 2048)], "bfloat16", seed,
+                                      lambda: torch.matmul(lhs, rhs).to(device=cpu))
 
   def check_match(nki_func):
     output = nki_func(lhs.T, rhs)
-    output_nki = output.to(device=cpu)
-    if torch.allclose(output_torch, output_nki, atol=1e-4, rtol=1e-2):
+    output_nki = output.to(device=cpu).float().numpy()
+    if np.allclose(output_torch, output_nki, atol=1e-4, rtol=1e-2):
       print("NKI and Torch match")
     else:
       print("NKI and Torch differ")
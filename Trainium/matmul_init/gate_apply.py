@@ -0,0 +1,131 @@
+"""
+Batched small-gate application for state-vector simulation on the device.
+
+A gate on bit k (bit 0 the least significant) pairs amplitudes 2^k apart. With the state
+viewed as a (2^(n-k-1), 2, 2^k) tensor, the pairs are [:, 0, :] and [:, 1, :], so a 2x2
+gate is four scaled adds over contiguous 2^k runs, done for every pair in one pass
+instead of a GEMM per pair. Two-qubit 4x4 gates use the (.., 2, .., 2, ..) view.
+
+States are split (real, imag) fp32 torch tensors, as elsewhere in matmul_init, and updated
+in place. The work is split into chunks of at most chunk_size amplitudes, so temporaries
+stay small and states beyond 2^30 amplitudes fit next to their working set. Zero gate
+entries are skipped, so X/Z/CNOT/CZ cost only copies and sign flips.
+
+apply_gate_reference / apply_two_qubit_gate_reference are plain NumPy versions for testing.
+"""
+
+import itertools
+import time
+
+import numpy as np
+import torch
+
+CHUNK_SIZE = 2**18  # keeps a chunk and its temporaries cache-sized; on the CPU larger chunks are slower
+
+def _gate_view(state, bits, num_qubits):
+    # bits in descending order -> (outer, 2, mid, 2, ..., inner)
+    shape = []
+    upper = num_qubits
+    for bit in bits:
+        shape += [2**(upper - bit - 1), 2]
+        upper = bit
+    return state.reshape(shape + [2**upper])
+
+def apply_gate_reference(state, gate, k):
+    # complex NumPy state of 2^n amplitudes, 2x2 gate on bit k
+    n = int(np.log2(state.size))
+    return np.einsum('ij,ajb->aib', gate, _gate_view(state, [k], n)).reshape(-1)
+
+def apply_two_qubit_gate_reference(state, gate, bits):
+    # 4x4 gate on |bit_a bit_b>, bit_a being the more significant index of the gate basis
+    n = int(np.log2(state.size))
+    a, b = bits
+    view = _gate_view(state, sorted(bits, reverse=True), n)
+    gate = gate.reshape(2, 2, 2, 2)
+    if a < b:
+        gate = gate.transpose(1, 0, 3, 2)  # the view has bit b before bit a
+    return np.einsum('ijkl,akblc->aibjc', gate, view).reshape(-1)
+
+def _chunks(view, chunk_size):
+    # Blocks of at most chunk_size amplitudes (at least one amplitude per gate slot). Every axis
+    # but the size-2 bit axes (odd positions in the _gate_view shape) is split, innermost axes
+    # are kept whole first so each block is made of the longest possible contiguous runs
+    free = range(0, view.dim(), 2)
+    budget = max(1, chunk_size // 2**(view.dim() // 2))
+    steps = {}
+    for axis in reversed(free):
+        steps[axis] = min(view.shape[axis], budget)
+        budget = max(1, budget // view.shape[axis])
+    for starts in itertools.product(*(range(0, view.shape[axis], steps[axis]) for axis in free)):
+        index = [slice(None)] * view.dim()
+        for axis, start in zip(free, starts):
+            index[axis] = slice(start, start + steps[axis])
+        yield view[tuple(index)]
+
+def _apply_split(real, imag, gate, slots, chunk_size):
+    # new[r] = sum_c gate[r, c] * old[c] over the amplitude slots, chunk by chunk, in place
+    gate = np.asarray(gate, dtype=np.complex128)
+    d = gate.shape[0]
+    for re, im in zip(_chunks(real, chunk_size), _chunks(imag, chunk_size)):
+        old_re = [re[slot].clone() for slot in slots]
+        old_im = [im[slot].clone() for slot in slots]
+        for r in range(d):
+            new_re = torch.zeros_like(old_re[0])
+            new_im = torch.zeros_like(old_im[0])
+            for c in range(d):
+                g_re, g_im = float(gate[r, c].real), float(gate[r, c].imag)
+                if g_re:
+                    new_re.add_(old_re[c], alpha=g_re)
+                    new_im.add_(old_im[c], alpha=g_re)
+                if g_im:
+                    new_re.add_(old_im[c], alpha=-g_im)
+                    new_im.add_(old_re[c], alpha=g_im)
+            re[slots[r]] = new_re
+            im[slots[r]] = new_im
+    return real, imag
+
+def apply_gate(real, imag, gate, k, chunk_size=CHUNK_SIZE):
+    # 2x2 gate on bit k of a 2^n state held as flat real/imag tensors
+    n = real.numel().bit_length() - 1
+    slots = [(slice(None), i) for i in range(2)]
+    _apply_split(_gate_view(real, [k], n), _gate_view(imag, [k], n), gate, slots, chunk_size)
+    return real, imag
+
+def apply_two_qubit_gate(real, imag, gate, bits, chunk_size=CHUNK_SIZE):
+    # 4x4 gate on |bit_a bit_b>, same basis order as apply_two_qubit_gate_reference
+    n = real.numel().bit_length() - 1
+    a, b = bits
+    high, low = max(a, b), min(a, b)
+    # slot for gate index 2*x_a + x_b in the (outer, bit high, mid, bit low, inner) view
+    slots = [(slice(None), x_a, slice(None), x_b) if a == high else (slice(None), x_b, slice(None), x_a)
+             for x_a in range(2) for x_b in range(2)]
+    _apply_split(_gate_view(real, [high, low], n), _gate_view(imag, [high, low], n), gate, slots, chunk_size)
+    return real, imag
+
+def random_state(rng, num_qubits):
+    state = rng.standard_normal(2**num_qubits) + 1j * rng.standard_normal(2**num_qubits)
+    return state / np.linalg.norm(state)
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    hadamard = np.array([[1, 1], [1, -1]]) / np.sqrt(2)
+    cnot = np.array([[1, 0, 0, 0], [0, 1, 0, 0], [0, 0, 0, 1], [0, 0, 1, 0]])
+    for n in [10, 20, 24]:
+        state = random_state(rng, n)
+        real = torch.tensor(state.real, dtype=torch.float32)
+        imag = torch.tensor(state.imag, dtype=torch.float32)
+        start = time.perf_counter()
+        for k in range(n):
+            apply_gate(real, imag, hadamard, k)
+        seconds = (time.perf_counter() - start) / n
+        apply_two_qubit_gate(real, imag, cnot, (n - 1, 0))
+        for k in range(n):
+            state = apply_gate_reference(state, hadamard, k)
+        state = apply_two_qubit_gate_reference(state, cnot, (n - 1, 0))
+        error = np.abs(real.numpy() + 1j * imag.numpy() - state).max()
+        for bits in [[k] for k in range(n)] + [[n - 1, 0], [n // 2, n // 2 - 1]]:
+            for chunk_size in [64, CHUNK_SIZE]:
+                largest = max(chunk.numel() for chunk in _chunks(_gate_view(real, bits, n), chunk_size))
+                assert largest <= chunk_size, f"chunk of {largest} amplitudes for bits {bits}"
+        print(f"n={n:<3} {seconds*1e3:8.2f} ms per 2x2 gate  ({2**n / seconds:.3e} amplitudes/s)  "
+              f"max error vs NumPy {error:.2e}")
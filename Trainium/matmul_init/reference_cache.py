@@ -0,0 +1,77 @@
+"""
+Content-addressed cache for reference outputs of kernel correctness checks.
+
+A reference is identified by (op, input shapes, dtype, seed): with seeded inputs these fully
+determine the output, so repeated runs load the stored result instead of recomputing the
+reference GEMM and copying it back from the device. Entries are .npy files opened
+memory-mapped, so only the pages a comparison touches are read.
+
+NumPy has no bfloat16, so references are stored as float32, which holds bf16 (and fp16)
+values exactly. The cache is kept under max_bytes by evicting least recently used files;
+a hit refreshes the file's mtime, which serves as the LRU clock.
+"""
+
+import hashlib
+import os
+
+import numpy as np
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "reference_cache")
+
+class ReferenceCache:
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=4 * 2**30):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+    def path(self, op, shapes, dtype, seed):
+        key = repr((op, tuple(tuple(shape) for shape in shapes), str(dtype), seed))
+        return os.path.join(self.cache_dir, f"{op}_{hashlib.sha1(key.encode()).hexdigest()[:16]}.npy")
+
+    def get(self, op, shapes, dtype, seed):
+        path = self.path(op, shapes, dtype, seed)
+        try:
+            array = np.load(path, mmap_mode="r")
+        except (FileNotFoundError, ValueError):
+            return None  # missing, or truncated by a crash before os.replace existed
+        os.utime(path)
+        return array
+
+    def put(self, op, shapes, dtype, seed, array):
+        path = self.path(op, shapes, dtype, seed)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp = path + ".tmp.npy"
+        np.save(tmp, np.asarray(array, dtype=np.float32))
+        os.replace(tmp, path)
+        self.evict(keep=path)
+        return np.load(path, mmap_mode="r")
+
+    def get_or_compute(self, op, shapes, dtype, seed, compute):
+        # compute() is only called on a miss; it may return a numpy array or a CPU torch tensor
+        array = self.get(op, shapes, dtype, seed)
+        if array is None:
+            result = compute()
+            if hasattr(result, "numpy"):
+                result = result.float().numpy()
+            array = self.put(op, shapes, dtype, seed, result)
+        return array
+
+    def evict(self, keep=None):
+        # Drop least recently used entries until the cache fits in max_bytes
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".npy") and not name.endswith(".tmp.npy"):
+                path = os.path.join(self.cache_dir, name)
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path != keep:
+                os.remove(path)
+                total -= size
+
+    def clear(self):
+        if os.path.isdir(self.cache_dir):
+            for name in os.listdir(self.cache_dir):
+                os.remove(os.path.join(self.cache_dir, name))
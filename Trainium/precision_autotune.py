@@ -0,0 +1,148 @@
+import time
+
+import numpy as np
+
+import error_analysis_2 as ea2
+from precision_formats import FORMATS, get_format
+from running_stats import RunningStats
+
+# Pick the cheapest emulated precision for a circuit family.
+# A configuration is a number format plus a renormalisation interval k (rescale the stored
+# state every k layers, None for never). Its cost is modelled as bytes moved relative to fp64:
+# every gate and every renormalisation is one pass over the state, each renormalisation
+# counting as two (norm reduction and rescale). Emulation wall time is reported alongside,
+# but it is about the same for every format and is not used for ranking.
+#
+# Configurations are ranked on the infidelity of the stored state against target_infidelity.
+# Its norm drift |<psi|psi> - 1|, the error in total probability when the state is used
+# without normalising it, is measured as well and can be bounded by an optional, separate
+# target_norm_drift: drift is first order in the rounding error (about 2^-mantissa) while
+# infidelity is second order, so the two cannot share one threshold. Renormalisation only
+# affects the drift: the infidelity is computed on normalised states, and a renormalisation
+# adds a rounding step of its own, so without a drift target the tuner never renormalises.
+
+RENORM_INTERVALS = [None, 64, 16, 4, 1]  # cheapest (never) to most accurate (every layer)
+
+def relative_cost(fmt, num_layers, gates_per_layer, renorm_every):
+    renorms = num_layers // renorm_every if renorm_every else 0
+    passes = num_layers * gates_per_layer + 2 * renorms
+    return float(fmt.bits / 64 * passes / (num_layers * gates_per_layer))
+
+class PrecisionAutotuner:
+    def __init__(self, qubits, depth, gate_set=None, entangler=None, pairing="brickwork",
+                 accumulate="float64", num_trials=50, seed=0, z=1.96):
+        self.accumulate = accumulate
+        self.z = z
+        # Every configuration is measured on the same circuits, so comparisons between
+        # configurations are not blurred by circuit-to-circuit variation
+        rng = np.random.default_rng(seed)
+        self.circuits = [ea2.generate_random_circuit(qubits, depth, entangler, pairing, rng, gate_set)
+                         for _ in range(num_trials)]
+        self.product = all(ea2.is_product_circuit(c) for c in self.circuits)
+        self.simulate = ea2.apply_circuit_product if self.product else ea2.apply_circuit
+        self.references = [self.simulate(c, "float64") for c in self.circuits]
+        self.num_layers = len(self.circuits[0])
+        self.gates_per_layer = float(np.mean([len(layer[0]) for c in self.circuits for layer in c]))
+        self.measured = {}
+
+    def measure(self, precision, renorm_every=None):
+        key = (precision, renorm_every)
+        if key in self.measured:
+            return self.measured[key]
+        stats = RunningStats()
+        drift = RunningStats()
+        start = time.perf_counter()
+        for circuit, reference in zip(self.circuits, self.references):
+            state = self.simulate(circuit, precision, self.accumulate, renorm_every=renorm_every)
+            if self.product:
+                infidelity, _ = ea2.product_state_errors(reference, state)
+                norm_squared = np.prod(np.sum(np.abs(state)**2, axis=1))
+            else:
+                overlap = np.vdot(reference / np.linalg.norm(reference), state / np.linalg.norm(state))
+                infidelity = 1 - np.abs(overlap)**2
+                norm_squared = np.sum(np.abs(state)**2)
+            stats.update(np.atleast_1d(infidelity))
+            drift.update(np.atleast_1d(np.abs(norm_squared - 1)))
+        seconds = (time.perf_counter() - start) / len(self.circuits)
+        fmt = get_format(precision)
+        result = {
+            "precision": precision,
+            "renorm_every": renorm_every,
+            "accumulate": self.accumulate,
+            "infidelity": float(stats.mean),
+            # the target has to hold for the upper end of the confidence interval
+            "infidelity_upper": float(stats.mean + stats.ci_halfwidth(self.z)),
+            "norm_drift": float(drift.mean),
+            "norm_drift_upper": float(drift.mean + drift.ci_halfwidth(self.z)),
+            "relative_cost": relative_cost(fmt, self.num_layers, self.gates_per_layer, renorm_every),
+            "seconds_per_circuit": seconds,
+        }
+        self.measured[key] = result
+        return result
+
+    def meets(self, precision, renorm_every, target, target_norm_drift=None):
+        result = self.measure(precision, renorm_every)
+        if target_norm_drift is not None and result["norm_drift_upper"] > target_norm_drift:
+            return False
+        return result["infidelity_upper"] <= target
+
+    def tune(self, target_infidelity, formats=None, renorm_intervals=RENORM_INTERVALS, target_norm_drift=None):
+        # Error is assumed to fall with more format bits (and, for equal bits, more mantissa bits),
+        # and norm drift with more frequent renormalisation, so both axes are binary-searched
+        # instead of measuring every combination. A format is reachable if it meets the targets
+        # with renormalisation either never (no extra rounding) or after every layer (least drift).
+        formats = sorted(formats or FORMATS,
+                         key=lambda name: (get_format(name).bits, get_format(name).mantissa_bits))
+        intervals = renorm_intervals if target_norm_drift is not None else renorm_intervals[:1]
+
+        def meets(precision, k):
+            return self.meets(precision, k, target_infidelity, target_norm_drift)
+
+        def reachable(precision):
+            return any(meets(precision, k) for k in (intervals[0], intervals[-1]))
+
+        # Cheapest format that can reach the target at all
+        lo, hi = 0, len(formats)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if reachable(formats[mid]):
+                hi = mid
+            else:
+                lo = mid + 1
+
+        best = None
+        for precision in formats[lo:]:
+            fmt = get_format(precision)
+            if best and relative_cost(fmt, self.num_layers, self.gates_per_layer, None) >= best["relative_cost"]:
+                break  # even without renormalisation this format costs more than the best so far
+            if not reachable(precision):
+                continue
+            # Least frequent renormalisation that still meets the target for this format
+            a, b = 0, len(intervals) - 1
+            if not meets(precision, intervals[0]):
+                a = 1
+                while a < b:
+                    mid = (a + b) // 2
+                    if meets(precision, intervals[mid]):
+                        b = mid
+                    else:
+                        a = mid + 1
+            candidate = self.measure(precision, intervals[a])
+            if best is None or candidate["relative_cost"] < best["relative_cost"]:
+                best = candidate
+        return best
+
+def autotune(qubits, depth, target_infidelity, gate_set=None, entangler=None, pairing="brickwork",
+             formats=None, renorm_intervals=RENORM_INTERVALS, accumulate="float64", num_trials=50, seed=0,
+             target_norm_drift=None):
+    # Returns the cheapest configuration meeting the target(s) as a dict (precision, renorm_every,
+    # accumulate, measured infidelity and norm drift, relative_cost, seconds_per_circuit), or None
+    # if no format reaches them. precision/accumulate/renorm_every can be passed straight to
+    # error_analysis_2.apply_circuit.
+    tuner = PrecisionAutotuner(qubits, depth, gate_set, entangler, pairing, accumulate, num_trials, seed)
+    return tuner.tune(target_infidelity, formats, renorm_intervals, target_norm_drift)
+
+if __name__ == "__main__":
+    for target in [1e-2, 1e-4, 1e-6, 1e-9]:
+        config = autotune(qubits=8, depth=20, target_infidelity=target, entangler="CNOT")
+        print(f"target {target:.0e}: {config}")
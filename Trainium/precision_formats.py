@@ -0,0 +1,80 @@
+import numpy as np
+
+# Emulated low-precision number formats for the error-analysis scripts.
+# Values are kept in float64 but rounded to what the target format can represent, by
+# masking the float64 bit pattern through a uint64 view. This is one vectorised pass for
+# every format, so bf16/fp8/tf32 cost about the same as the old fp16 astype round trip.
+
+ACCUMULATE_DTYPES = {"float64": np.complex128, "float32": np.complex64}
+
+class NumberFormat:
+    def __init__(self, name, mantissa_bits, exponent_bits, max_value=None, saturate=False):
+        self.name = name
+        self.mantissa_bits = mantissa_bits
+        self.exponent_bits = exponent_bits
+        bias = 2**(exponent_bits - 1) - 1
+        self.min_normal = 2.0**(1 - bias)
+        self.subnormal_step = 2.0**(1 - bias - mantissa_bits)
+        # IEEE-style by default: the top exponent is reserved for inf/nan
+        self.max_value = max_value if max_value is not None else (2 - 2.0**-mantissa_bits) * 2.0**bias
+        self.saturate = saturate  # clamp to +-max_value instead of overflowing to inf
+        self.bits = 1 + exponent_bits + mantissa_bits
+
+    def quantize(self, x, rounding="nearest", rng=None):
+        # rounding: "nearest" (round half to even) or "stochastic"
+        x = np.array(x, dtype=np.float64)
+        drop = 52 - self.mantissa_bits
+        bits = x.copy().view(np.uint64)
+        if rounding == "nearest":
+            bits += np.uint64((1 << (drop - 1)) - 1) + ((bits >> np.uint64(drop)) & np.uint64(1))
+        elif rounding == "stochastic":
+            bits += random_bits(rng, drop, bits.shape)
+        else:
+            raise ValueError(f"Unknown rounding mode: {rounding}")
+        bits &= ~np.uint64((1 << drop) - 1)
+        y = bits.view(np.float64)
+
+        # Below the normal range the spacing is fixed at subnormal_step
+        small = np.abs(x) < self.min_normal
+        if small.any():
+            scaled = x[small] / self.subnormal_step
+            if rounding == "nearest":
+                y[small] = np.round(scaled) * self.subnormal_step
+            else:
+                y[small] = np.floor(scaled + random_uniform(rng, scaled.shape)) * self.subnormal_step
+
+        overflow = np.abs(y) > self.max_value
+        if overflow.any():
+            y[overflow] = np.sign(y[overflow]) * (self.max_value if self.saturate else np.inf)
+        return y
+
+    def quantize_complex(self, z, rounding="nearest", rng=None):
+        return self.quantize(z.real, rounding, rng) + 1j * self.quantize(z.imag, rounding, rng)
+
+def random_bits(rng, drop, shape):
+    # rng=None draws from the global np.random state, like the rest of the scripts
+    if rng is None:
+        return np.random.randint(0, 1 << drop, size=shape, dtype=np.uint64)
+    return rng.integers(0, 1 << drop, size=shape, dtype=np.uint64)
+
+def random_uniform(rng, shape):
+    return np.random.uniform(size=shape) if rng is None else rng.uniform(size=shape)
+
+FORMATS = {}
+
+def register_format(fmt):
+    FORMATS[fmt.name] = fmt
+    return fmt
+
+def get_format(name):
+    if name not in FORMATS:
+        raise ValueError(f"Unknown precision format: {name}")
+    return FORMATS[name]
+
+register_format(NumberFormat("float32", mantissa_bits=23, exponent_bits=8))
+register_format(NumberFormat("tf32", mantissa_bits=10, exponent_bits=8))
+register_format(NumberFormat("float16", mantissa_bits=10, exponent_bits=5))
+register_format(NumberFormat("bfloat16", mantissa_bits=7, exponent_bits=8))
+# fp8 e4m3 has no inf and tops out at 448; e5m2 keeps IEEE-style inf
+register_format(NumberFormat("fp8_e4m3", mantissa_bits=3, exponent_bits=4, max_value=448.0, saturate=True))
+register_format(NumberFormat("fp8_e5m2", mantissa_bits=2, exponent_bits=5))
@@ -0,0 +1,96 @@
+import numpy as np
+
+# Constant-memory statistics for the precision sweeps.
+# Mean and variance use Welford's update in the batched form of Chan et al., so whole
+# trial chunks (or whole RunningStats from other workers) are merged in one step.
+# Quantiles come from a log-spaced histogram: the errors span many decades, and a fixed
+# number of bins per decade gives the same relative resolution everywhere.
+
+class RunningStats:
+    def __init__(self, shape=(), lo=1e-20, hi=1e2, bins_per_decade=20):
+        # shape: one accumulator per element, e.g. one per depth checkpoint
+        self.shape = tuple(shape)
+        self.lo, self.hi, self.bins_per_decade = lo, hi, bins_per_decade
+        # bin 0 collects values <= lo (zeros and tiny negative round-off), the last bin values >= hi
+        self.num_bins = int(round(np.log10(hi / lo) * bins_per_decade)) + 2
+        self.count = 0
+        self.mean = np.zeros(self.shape)
+        self.m2 = np.zeros(self.shape)
+        self.hist = np.zeros(self.shape + (self.num_bins,), dtype=np.int64)
+
+    def update(self, samples):
+        # samples: array of shape `shape + (n,)`, the last axis running over trials
+        samples = np.asarray(samples, dtype=np.float64)
+        n = samples.shape[-1]
+        if n == 0:
+            return self
+        batch_mean = samples.mean(axis=-1)
+        batch_m2 = ((samples - batch_mean[..., None])**2).sum(axis=-1)
+        self._combine(n, batch_mean, batch_m2)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            bins = np.floor((np.log10(samples) - np.log10(self.lo)) * self.bins_per_decade) + 1
+        bins = np.clip(np.nan_to_num(bins, nan=0, neginf=0), 0, self.num_bins - 1).astype(np.int64)
+        offsets = np.arange(int(np.prod(self.shape)), dtype=np.int64).reshape(self.shape + (1,)) * self.num_bins
+        self.hist += np.bincount((bins + offsets).ravel(),
+                                 minlength=self.hist.size).reshape(self.hist.shape)
+        return self
+
+    def merge(self, other):
+        if other.count:
+            self._combine(other.count, other.mean, other.m2)
+            self.hist += other.hist
+        return self
+
+    def _combine(self, n, mean, m2):
+        total = self.count + n
+        delta = mean - self.mean
+        self.mean = self.mean + delta * n / total
+        self.m2 = self.m2 + m2 + delta**2 * self.count * n / total
+        self.count = total
+
+    def variance(self):
+        return self.m2 / self.count  # population variance, like np.var / np.std
+
+    def std(self):
+        return np.sqrt(self.variance())
+
+    def sem(self):
+        return self.std() / np.sqrt(self.count)
+
+    def ci_halfwidth(self, z=1.96):
+        return z * self.sem()
+
+    def quantile(self, q):
+        # Geometric centre of the histogram bin holding the q-th quantile
+        cumulative = np.cumsum(self.hist, axis=-1)
+        index = np.argmax(cumulative >= q * self.count, axis=-1)
+        centres = self.lo * 10.0**((index - 0.5) / self.bins_per_decade)
+        return np.where(index == 0, 0.0, np.minimum(centres, self.hi))
+
+    def converged(self, tol=None, rel_tol=None, z=1.96):
+        # True once the CI half-width is below tol, or below rel_tol * |mean|, for every element
+        if self.count < 2:
+            return False
+        halfwidth = self.ci_halfwidth(z)
+        done = np.zeros(self.shape, dtype=bool)
+        if tol is not None:
+            done |= halfwidth <= tol
+        if rel_tol is not None:
+            done |= halfwidth <= rel_tol * np.abs(self.mean)
+        return bool(np.all(done))
+
+    def to_arrays(self, prefix=""):
+        return {prefix + "count": np.array(self.count), prefix + "mean": self.mean,
+                prefix + "m2": self.m2, prefix + "hist": self.hist,
+                prefix + "binning": np.array([self.lo, self.hi, self.bins_per_decade])}
+
+    @classmethod
+    def from_arrays(cls, arrays, prefix=""):
+        lo, hi, bins_per_decade = arrays[prefix + "binning"]
+        stats = cls(arrays[prefix + "mean"].shape, lo, hi, int(bins_per_decade))
+        stats.count = int(arrays[prefix + "count"])
+        stats.mean = np.array(arrays[prefix + "mean"])
+        stats.m2 = np.array(arrays[prefix + "m2"])
+        stats.hist = np.array(arrays[prefix + "hist"])
+        return stats
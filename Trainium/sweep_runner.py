@@ -0,0 +1,119 @@
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from tqdm import tqdm
+
+from running_stats import RunningStats
+
+# Parallel, resumable runner for the error-analysis sweeps.
+# A sweep point (qubits, depth) is split into trial chunks. Every chunk gets its own
+# Generator seeded from SeedSequence([seed, qubits, depth, chunk]), so results depend only
+# on the seed and chunk_size, not on the number of workers or the order chunks finish in.
+# Each chunk is reduced to RunningStats in the worker, so memory does not grow with the
+# number of trials, and finished chunks are written to cache_dir and skipped when the sweep
+# is run again.
+
+def chunk_path(cache_dir, tag, point, chunk, size, seed):
+    qubits, depth = point
+    return os.path.join(cache_dir, tag, f"q{qubits}_d{depth}_c{chunk}_n{size}_s{seed}.stats.npz")
+
+def config_tag(trial_fn, trial_kwargs):
+    # Chunks computed with different trial functions or settings never share a cache entry
+    key = repr((trial_fn.__module__, trial_fn.__name__, sorted(trial_kwargs.items())))
+    return f"{trial_fn.__name__}_{hashlib.sha1(key.encode()).hexdigest()[:12]}"
+
+def run_chunk(trial_fn, point, chunk, size, seed, trial_kwargs):
+    qubits, depth = point
+    rng = np.random.default_rng(np.random.SeedSequence([seed, qubits, depth, chunk]))
+    metrics = [np.asarray(m) for m in trial_fn(qubits, depth, size, rng, **trial_kwargs)]
+    return tuple(RunningStats(m.shape[:-1]).update(m) for m in metrics)
+
+def save_chunk(path, result):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    arrays = {}
+    for i, stats in enumerate(result):
+        arrays.update(stats.to_arrays(f"m{i}_"))
+    tmp = path + ".tmp.npz"
+    np.savez(tmp, **arrays)
+    os.replace(tmp, path)  # a crash mid-write never leaves a truncated chunk behind
+
+def load_chunk(path):
+    with np.load(path) as data:
+        num_metrics = len({key.split("_")[0] for key in data.files})
+        return tuple(RunningStats.from_arrays(data, f"m{i}_") for i in range(num_metrics))
+
+def run_sweep(trial_fn, points, num_trials, chunk_size=1000, seed=0, workers=None, cache_dir=None,
+              trial_kwargs=None, desc="Sweep", tol=None, rel_tol=None, tol_metric=0, lookahead=None):
+    # trial_fn(qubits, depth, num_trials, rng, **trial_kwargs) must be a module-level function
+    # returning a tuple of metric arrays whose last axis runs over trials.
+    # Returns {(qubits, depth): tuple of RunningStats, one per metric}.
+    #
+    # With tol/rel_tol a point stops early, once the 95% CI half-width of metric tol_metric is
+    # below tol (absolute) or rel_tol * |mean|; num_trials is then only the upper limit.
+    # Chunks are merged strictly in chunk order and sampling stops at the first chunk that
+    # meets the target, so the result is still independent of the worker count. Up to
+    # `lookahead` chunks per point are computed ahead of that check.
+    trial_kwargs = trial_kwargs or {}
+    tag = config_tag(trial_fn, trial_kwargs)
+    adaptive = tol is not None or rel_tol is not None
+    sizes = [min(chunk_size, num_trials - start) for start in range(0, num_trials, chunk_size)]
+    if not adaptive:
+        lookahead = len(sizes)
+    elif lookahead is None:
+        lookahead = workers or os.cpu_count() or 1
+
+    merged = {point: None for point in points}
+    next_chunk = {point: 0 for point in points}
+    active = list(points)
+    pool = ProcessPoolExecutor(max_workers=workers) if workers != 1 else None
+    bar = tqdm(total=len(points) * len(sizes), desc=desc)
+    try:
+        while active:
+            # Submit (or load from the cache) the next round of chunks for every active point
+            rounds = {}
+            for point in active:
+                first = next_chunk[point]
+                for chunk in range(first, min(first + lookahead, len(sizes))):
+                    path = chunk_path(cache_dir, tag, point, chunk, sizes[chunk], seed) if cache_dir else None
+                    # (path, result or future, freshly computed and still to be written to the cache)
+                    if path and os.path.exists(path):
+                        rounds[(point, chunk)] = (path, load_chunk(path), False)
+                    elif pool is None:
+                        rounds[(point, chunk)] = (path, run_chunk(trial_fn, point, chunk, sizes[chunk], seed,
+                                                                  trial_kwargs), True)
+                    else:
+                        rounds[(point, chunk)] = (path, pool.submit(run_chunk, trial_fn, point, chunk, sizes[chunk],
+                                                                    seed, trial_kwargs), True)
+
+            still_active = []
+            for point in active:
+                done = False
+                for chunk in range(next_chunk[point], min(next_chunk[point] + lookahead, len(sizes))):
+                    path, result, fresh = rounds[(point, chunk)]
+                    if not isinstance(result, tuple):
+                        result = result.result()
+                    if fresh and path:
+                        save_chunk(path, result)
+                    if done:
+                        continue  # computed ahead but past the stopping point, kept only in the cache
+                    if merged[point] is None:
+                        merged[point] = tuple(RunningStats(s.shape, s.lo, s.hi, s.bins_per_decade) for s in result)
+                    for total, stats in zip(merged[point], result):
+                        total.merge(stats)
+                    bar.update()
+                    next_chunk[point] = chunk + 1
+                    if adaptive and merged[point][tol_metric].converged(tol, rel_tol):
+                        done = True
+                if done:
+                    bar.total -= len(sizes) - next_chunk[point]
+                    bar.refresh()
+                elif next_chunk[point] < len(sizes):
+                    still_active.append(point)
+            active = still_active
+    finally:
+        bar.close()
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+    return merged
@@ -0,0 +1,87 @@
+import time
+
+import numpy as np
+import torch
+
+import error_analysis as ea1
+from gate_tables import gate_matrices
+
+try:
+    from torch_xla.core import xla_model as xm
+except ImportError:
+    xm = None
+
+# Native low-precision backend for the batched single-qubit precision study.
+# The emulated formats in precision_formats round float64 results after every gate; here the
+# same circuits run through torch in the real dtype, on a Trainium XLA device when torch_xla is
+# installed (as in matmul_init/example.py) and on the CPU otherwise. complex bf16 does not exist
+# in torch, so states and gates are kept as split real/imag tensors, as in the fp16 emulation.
+
+TORCH_DTYPES = {"float64": torch.float64, "float32": torch.float32,
+                "float16": torch.float16, "bfloat16": torch.bfloat16}
+
+def get_device():
+    return xm.xla_device() if xm is not None else torch.device("cpu")
+
+def sync(device):
+    # XLA tensors are lazy: cut the graph so every step is compiled and run once
+    if xm is not None and device.type == "xla":
+        xm.mark_step()
+
+def apply_circuit_batch_torch(codes, thetas, precision="bfloat16", device=None, checkpoints=None):
+    # Same circuits and return convention as error_analysis.apply_circuit_batch, computed
+    # natively in `precision`; the result is returned as a complex128 numpy array
+    device = device or get_device()
+    dtype = TORCH_DTYPES[precision]
+    num_trials, depth = codes.shape
+    record = set(ea1.sorted_checkpoints(checkpoints, depth)) if checkpoints is not None else ()
+    snapshots = []
+
+    gates = gate_matrices(codes, thetas)  # (num_trials, depth, 2, 2)
+    gates_re = torch.tensor(gates.real, dtype=dtype, device=device)
+    gates_im = torch.tensor(gates.imag, dtype=dtype, device=device)
+    real = torch.zeros((num_trials, 2), dtype=dtype, device=device)
+    imag = torch.zeros((num_trials, 2), dtype=dtype, device=device)
+    real[:, 0] = 1.0
+    for step in range(depth):
+        g_re, g_im = gates_re[:, step], gates_im[:, step]
+        real, imag = (torch.einsum('tij,tj->ti', g_re, real) - torch.einsum('tij,tj->ti', g_im, imag),
+                      torch.einsum('tij,tj->ti', g_re, imag) + torch.einsum('tij,tj->ti', g_im, real))
+        sync(device)
+        if step + 1 in record:
+            snapshots.append(to_complex(real, imag))
+    return np.stack(snapshots) if checkpoints is not None else to_complex(real, imag)
+
+def to_complex(real, imag):
+    return real.cpu().double().numpy() + 1j * imag.cpu().double().numpy()
+
+def compare_backends(num_trials=10000, depth=100, precisions=("float16", "bfloat16"), device=None, seed=0):
+    # Run the same random circuits through the fp64 reference, the NumPy emulation and the
+    # native torch path, and report error and throughput (gates/s) side by side
+    device = device or get_device()
+    codes, thetas = ea1.generate_random_circuit_batch(num_trials, depth, np.random.default_rng(seed))
+    gates = num_trials * depth
+    reference = ea1.apply_circuit_batch(codes, thetas, "float64")
+
+    rows = []
+    for precision in precisions:
+        for backend in ("emulated", "native"):
+            start = time.perf_counter()
+            if backend == "emulated":
+                state = ea1.apply_circuit_batch(codes, thetas, precision)
+            else:
+                state = apply_circuit_batch_torch(codes, thetas, precision, device)
+            seconds = time.perf_counter() - start
+            fidelity_errors, norm_errors = ea1.state_errors(reference, state)
+            rows.append({"precision": precision, "backend": backend,
+                         "device": str(device) if backend == "native" else "numpy",
+                         "gates_per_second": gates / seconds,
+                         "mean_fidelity_error": float(np.mean(fidelity_errors)),
+                         "mean_l2_distance": float(np.mean(norm_errors))})
+    return rows
+
+if __name__ == "__main__":
+    print(f"{'precision':<10} {'backend':<9} {'device':<8} {'gates/s':>12} {'1 - F':>10} {'L2':>10}")
+    for row in compare_backends():
+        print(f"{row['precision']:<10} {row['backend']:<9} {row['device']:<8} {row['gates_per_second']:>12.3e} "
+              f"{row['mean_fidelity_error']:>10.2e} {row['mean_l2_distance']:>10.2e}")
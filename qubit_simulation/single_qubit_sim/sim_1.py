@@ -1,6 +1,10 @@
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
 import numpy as np
 import scipy.linalg as la
 import scipy.integrate as integrate
+import scipy.sparse as sp
 import matplotlib.pyplot as plt
 
 # Parameters for the transmon Hamiltonian
@@ -25,95 +29,354 @@ beta = 1 / (temperature * 0.02084)  # Convert to GHz^-1 (k_B/h = 0.02084 GHz/K)
 hbar = 1.0  # natural units where hbar = 1
 
 # Helper: Transmon Hamiltonian
-def transmon_hamiltonian(EC, EJ, n_max):
+# In the charge basis n = -n_max..n_max, H = 4 EC (n - ng)^2 - EJ/2 (|n><n+1| + h.c.) is
+# tridiagonal and only the lowest levels are needed, so the spectrum comes from a tridiagonal
+# eigensolver restricted to those indices. Results are memoised per (EC, EJ, n_max, ng) and
+# returned read-only, since cached arrays are shared between callers.
+def fix_signs(eigvecs):
+    # Make the largest component of every eigenvector positive, so matrix elements are
+    # reproducible across solvers and smooth across parameter sweeps
+    largest = np.take_along_axis(eigvecs, np.argmax(np.abs(eigvecs), axis=-2)[..., None, :], axis=-2)
+    return eigvecs * np.sign(largest)
+
+@lru_cache(maxsize=4096)
+def transmon_spectrum(EC, EJ, n_max, ng=0.0, levels=num_levels):
+    # Lowest `levels` energies and eigenvectors, plus charge and cos(phi) matrix elements between them
+    n = np.arange(-n_max, n_max + 1)
+    eigvals, eigvecs = la.eigh_tridiagonal(4 * EC * (n - ng)**2, np.full(2 * n_max, -EJ / 2),
+                                           select="i", select_range=(0, levels - 1))
+    eigvecs = fix_signs(eigvecs)
+    result = (eigvals, eigvecs, charge_operator(eigvecs, n_max), cos_phi_operator(eigvecs, n_max))
+    for array in result:
+        array.flags.writeable = False
+    return result
+
+def transmon_hamiltonian(EC, EJ, n_max, ng=0.0):
+    eigvals, eigvecs, _, _ = transmon_spectrum(EC, EJ, n_max, ng)
+    return eigvals, eigvecs
+
+def transmon_spectrum_grid(EC, EJ, ng=0.0, n_max=n_max, levels=num_levels, chunk_size=1000):
+    # Spectrum over whole parameter grids: EC, EJ and ng broadcast against each other.
+    # Returns energies (..., levels) and charge / cos(phi) matrix elements (..., levels, levels).
+    # The grid is diagonalised in batches with one LAPACK call per chunk instead of a Python
+    # call per point.
+    EC, EJ, ng = np.broadcast_arrays(EC, EJ, ng)
+    shape = EC.shape
+    EC, EJ, ng = (np.ravel(a).astype(float) for a in (EC, EJ, ng))
     n = np.arange(-n_max, n_max + 1)
-    H = np.diag(4 * EC * n**2) - (EJ / 2) * (np.diag(np.ones(2*n_max), 1) + np.diag(np.ones(2*n_max), -1))
-    eigvals, eigvecs = la.eigh(H)
-    return eigvals[:num_levels], eigvecs[:, :num_levels]
+    diagonal = np.arange(2 * n_max + 1)
+    energies = np.empty((EC.size, levels))
+    charge = np.empty((EC.size, levels, levels))
+    cos_phi = np.empty((EC.size, levels, levels))
+    for start in range(0, EC.size, chunk_size):
+        part = slice(start, start + chunk_size)
+        H = np.zeros((len(EC[part]), len(n), len(n)))
+        H[:, diagonal, diagonal] = 4 * EC[part, None] * (n - ng[part, None])**2
+        H[:, diagonal[:-1], diagonal[1:]] = H[:, diagonal[1:], diagonal[:-1]] = -EJ[part, None] / 2
+        eigvals, eigvecs = np.linalg.eigh(H)
+        eigvecs = fix_signs(eigvecs[..., :levels])
+        energies[part] = eigvals[:, :levels]
+        charge[part] = charge_operator(eigvecs, n_max)
+        cos_phi[part] = cos_phi_operator(eigvecs, n_max)
+    return energies.reshape(shape + (levels,)), charge.reshape(shape + (levels, levels)), \
+        cos_phi.reshape(shape + (levels, levels))
 
 # Noise operators (Charge and Phase operators)
+# Both work on single (dim, levels) or stacked (..., dim, levels) eigenvector arrays
 def charge_operator(eigvecs, n_max):
     n = np.arange(-n_max, n_max + 1)
-    charge_op = np.diag(n)
-    return eigvecs.conj().T @ charge_op @ eigvecs
+    return eigvecs.conj().swapaxes(-1, -2) @ (n[:, None] * eigvecs)
 
 def cos_phi_operator(eigvecs, n_max):
-    cos_phi_op = 0.5 * (np.diag(np.ones(2*n_max), 1) + np.diag(np.ones(2*n_max), -1))
-    return eigvecs.conj().T @ cos_phi_op @ eigvecs
+    # cos(phi) = (|n><n+1| + h.c.) / 2 couples neighbouring charge states only
+    hopping = eigvecs[..., :-1, :].conj().swapaxes(-1, -2) @ eigvecs[..., 1:, :]
+    return 0.5 * (hopping + hopping.conj().swapaxes(-1, -2))
 
 # Generate fluctuators for 1/f noise
-def generate_fluctuators(t, num_fluctuators, gamma_min, gamma_max):
-    gammas = np.exp(np.random.uniform(np.log(gamma_min), np.log(gamma_max), num_fluctuators))
-    states = np.random.choice([-1, 1], size=num_fluctuators)
-    fluctuators = np.zeros_like(t)
-    for i, gamma in enumerate(gammas):
-        switch_times = np.cumsum(np.random.exponential(1/gamma, int(t[-1]*gamma*10)))
-        for time in switch_times:
-            states[i] *= -1
-            fluctuators[t >= time] += states[i]
-    return fluctuators / np.sqrt(num_fluctuators)
+# Each fluctuator is a +-1 random telegraph process switching at rate gamma (Poisson switching
+# times); rates are log-uniform in [gamma_min, gamma_max], which gives a 1/f spectrum in between.
+# Switching events of all fluctuators are drawn at once, merged in time order and turned into
+# the summed process with a cumulative sum of jumps, then sampled on the grid with searchsorted.
+# Long grids are processed in chunks, carrying the fluctuator states across chunk boundaries.
+def telegraph_events(rng, gammas, states, t_start, t_end):
+    # Switching events on (t_start, t_end]: event times in order, the jump of the summed
+    # process at each event, and the fluctuator states at t_end
+    counts = rng.poisson(gammas * (t_end - t_start))
+    owner = np.repeat(np.arange(len(gammas)), counts)
+    times = rng.uniform(t_start, t_end, counts.sum())
+    order = np.lexsort((times, owner))
+    times, owner = times[order], owner[order]
+    # parity of each switch within its own fluctuator gives the state it switches away from
+    k = np.arange(len(times)) - np.repeat(np.cumsum(counts) - counts, counts)
+    jumps = -2 * states[owner] * (1 - 2 * (k % 2))
+    order = np.argsort(times, kind="stable")
+    return times[order], jumps[order], states * (1 - 2 * (counts % 2))
+
+def telegraph_noise_chunks(t, num_fluctuators, gamma_min, gamma_max, rng=None, chunk_size=2**20):
+    # Yields the normalised summed telegraph noise on consecutive chunks of the grid t
+    rng = rng or np.random.default_rng()
+    gammas = np.exp(rng.uniform(np.log(gamma_min), np.log(gamma_max), num_fluctuators))
+    states = rng.choice([-1, 1], size=num_fluctuators)
+    previous = t[0]
+    for start in range(0, len(t), chunk_size):
+        chunk = t[start:start + chunk_size]
+        times, jumps, end_states = telegraph_events(rng, gammas, states, previous, chunk[-1])
+        steps = np.concatenate(([0], np.cumsum(jumps)))
+        yield (states.sum() + steps[np.searchsorted(times, chunk, side="right")]) / np.sqrt(num_fluctuators)
+        states, previous = end_states, chunk[-1]
+
+def one_over_f_noise(t, gamma_min, gamma_max, rng=None):
+    # Spectral synthesis: Gaussian noise with S(omega) ~ 1/omega for gamma_min <= omega <= gamma_max
+    # and unit variance, the many-fluctuator limit of the telegraph sum. Needs a uniform grid.
+    rng = rng or np.random.default_rng()
+    n = len(t)
+    omega = 2 * np.pi * np.fft.rfftfreq(n, t[1] - t[0])
+    band = (omega >= gamma_min) & (omega <= gamma_max)
+    if not band.any():
+        raise ValueError("No grid frequency lies in [gamma_min, gamma_max]; use a longer or finer grid")
+    amplitude = np.where(band, 1 / np.sqrt(np.where(band, omega, 1)), 0)
+    spectrum = amplitude * (rng.standard_normal(len(omega)) + 1j * rng.standard_normal(len(omega)))
+    # irfft keeps only the real part of the DC and Nyquist bins; interior bins count twice
+    weights = np.full(len(omega), 4.0)
+    weights[0] = 1
+    if n % 2 == 0:
+        weights[-1] = 1
+    return np.fft.irfft(spectrum, n) * n / np.sqrt(np.sum(weights * amplitude**2))
+
+def generate_fluctuators(t, num_fluctuators, gamma_min, gamma_max, rng=None, method="telegraph", chunk_size=2**20):
+    if method == "fft":
+        return one_over_f_noise(t, gamma_min, gamma_max, rng)
+    if method != "telegraph":
+        raise ValueError(f"Unknown fluctuator method: {method}")
+    return np.concatenate(list(telegraph_noise_chunks(t, num_fluctuators, gamma_min, gamma_max, rng, chunk_size)))
+
+# Piecewise-constant noise traces: values[k] holds on [switch_times[k], switch_times[k+1])
+def telegraph_trace(t_start, t_end, num_fluctuators, gamma_min, gamma_max, rng=None):
+    # Exact summed telegraph process on [t_start, t_end], one segment per switching event
+    rng = rng or np.random.default_rng()
+    gammas = np.exp(rng.uniform(np.log(gamma_min), np.log(gamma_max), num_fluctuators))
+    states = rng.choice([-1, 1], size=num_fluctuators)
+    times, jumps, _ = telegraph_events(rng, gammas, states, t_start, t_end)
+    values = (states.sum() + np.concatenate(([0], np.cumsum(jumps)))) / np.sqrt(num_fluctuators)
+    return np.concatenate(([t_start], times)), values
+
+def grid_trace(time_grid, fluctuators):
+    # Noise sampled on a grid, held the way master_equation looks it up: fluctuators[j] on (t_j-1, t_j]
+    return time_grid[:-1], fluctuators[1:]
 
 # Ohmic bath correlation function
 def ohmic_spectrum(omega, g, wc):
     return (2 * np.pi * g**2 * omega * np.exp(-np.abs(omega)/wc)) / (1 - np.exp(-beta * omega))
 
+# Liouvillian superoperator
+# With row-major vectorisation (rho.flatten()), vec(A rho B) = (A kron B^T) vec(rho), so every
+# term of the master equation is a fixed d^2 x d^2 matrix. H_sys, Ax and Az never change: the
+# time-independent part L0 is built once, and the fluctuator term is L1 scaled by the
+# telegraph value, d(vec rho)/dt = L0 vec(rho) + f(t) L1 vec(rho).
+SPARSE_MIN_DIM = 16  # use sparse superoperators from this Hilbert-space dimension on
+
+def left(A):
+    return sp.kron(A, sp.identity(A.shape[0]), format="csr")
+
+def right(A):
+    return sp.kron(sp.identity(A.shape[0]), A.T, format="csr")
+
+def commutator_superop(H):
+    # vec(-i [H, rho])
+    return -1j * (left(H) - right(H))
+
+def dissipator_superop(A):
+    # vec(A rho A - (A A rho + rho A A) / 2)
+    AA = A @ A
+    return left(A) @ right(A) - 0.5 * (left(AA) + right(AA))
+
+def liouvillian(H_sys, Ax, Az, gx, gz, b, sparse=None):
+    # Returns (L0, L1); sparse=None picks sparse matrices for large Hilbert spaces
+    L0 = commutator_superop(H_sys) + gx**2 * dissipator_superop(Ax) + gz**2 * dissipator_superop(Az)
+    L1 = commutator_superop(b * Az)
+    if sparse is None:
+        sparse = H_sys.shape[0] >= SPARSE_MIN_DIM
+    if not sparse:
+        L0, L1 = L0.toarray(), L1.toarray()
+    return L0, L1
+
 # Master equation dynamics
-def master_equation(t, rho_flat, H_sys, Ax, Az, fluctuators, gx, gz, wx_c, wz_c, b):
-    rho = rho_flat.reshape(H_sys.shape)
-    commutator = -1j * (H_sys @ rho - rho @ H_sys)
-
-    # Add fluctuators (classical noise on Az)
-    H_fluctuator = Az * b * fluctuators[np.searchsorted(time_grid, t)]
-    fluctuator_term = -1j * (H_fluctuator @ rho - rho @ H_fluctuator)
-
-    # Simple Lindblad-type approximations for Ohmic baths
-    Ax_dissipator = gx**2 * (Ax @ rho @ Ax - 0.5*(Ax @ Ax @ rho + rho @ Ax @ Ax))
-    Az_dissipator = gz**2 * (Az @ rho @ Az - 0.5*(Az @ Az @ rho + rho @ Az @ Az))
-
-    drho_dt = commutator + fluctuator_term + Ax_dissipator + Az_dissipator
-    return drho_dt.flatten()
-
-# Initialization
-eigvals, eigvecs = transmon_hamiltonian(EC, EJ, n_max)
-H_sys = np.diag(eigvals)
-Ax = charge_operator(eigvecs, n_max)
-Az = cos_phi_operator(eigvecs, n_max)
-
-# Initial state: |1> state
-rho0 = np.zeros((num_levels, num_levels), dtype=complex)
-rho0[1, 1] = 1.0
-
-# Time evolution setup
-t_max = 2  # total simulation time (2 µs)
-num_points = 500
-time_grid = np.linspace(0, t_max, num_points)
-
-# Generate fluctuators
-fluctuators = generate_fluctuators(time_grid, num_fluctuators, gamma_min, gamma_max)
-
-# Solve master equation
-sol = integrate.solve_ivp(
-    master_equation,
-    [0, t_max],
-    rho0.flatten(),
-    args=(H_sys, Ax, Az, fluctuators, gx, gz, wx_c, wz_c, b),
-    t_eval=time_grid,
-    method='RK45'
-)
-
-# Extract populations
-rho_t = sol.y.T.reshape(-1, num_levels, num_levels)  # shape: (num_points, num_levels, num_levels)
-populations = np.real(np.diagonal(rho_t, axis1=1, axis2=2))  # shape: (num_points, num_levels)
-populations = populations.T  # shape: (num_levels, num_points)
-
-# Plot population dynamics
-plt.figure(figsize=(8,5))
-for i in range(num_levels):
-    plt.plot(time_grid*1e6, populations[i], label=f'Level {i}')
-plt.xlabel('Time (µs)')
-plt.ylabel('Population')
-plt.title('Transmon Qubit State Dynamics with Noise')
-plt.legend()
-plt.grid(True)
-plt.tight_layout()
-plt.show()
+def master_equation(t, rho_flat, L0, L1, fluctuators, time_grid):
+    # One matvec for the fixed part and one scaled matvec for the classical noise on Az
+    f = fluctuators[np.searchsorted(time_grid, t)]
+    return L0 @ rho_flat + f * (L1 @ rho_flat)
+
+# Event-driven solver
+# Between switching events the generator L0 + f L1 is constant, so the evolution over a
+# segment is exactly expm((L0 + f L1) dt). Segments are cut at the switching events and at
+# the output times; propagators are cached by (f, dt), and on a uniform grid or with a
+# discrete set of noise values most segments reuse a cached propagator.
+def propagator_cache(L0, L1, maxsize=4096):
+    L0 = L0.toarray() if sp.issparse(L0) else L0
+    L1 = L1.toarray() if sp.issparse(L1) else L1
+
+    @lru_cache(maxsize=maxsize)
+    def propagator(f, dt):
+        return la.expm((L0 + f * L1) * dt)
+
+    # dt is rounded so that grid steps differing only in the last bits share an entry
+    return lambda f, dt: propagator(float(f), round(float(dt), 12))
+
+def evolve_piecewise(rho0, L0, L1, switch_times, values, t_eval, propagator=None):
+    # Density matrices at t_eval (shape (len(t_eval), d, d)); needs switch_times[0] <= t_eval[0]
+    propagator = propagator or propagator_cache(L0, L1)
+    d = rho0.shape[0]
+    rho = rho0.flatten()
+    rho_t = np.empty((len(t_eval), d, d), dtype=complex)
+    t = t_eval[0]
+    segment = np.searchsorted(switch_times, t, side="right") - 1
+    for j, target in enumerate(t_eval):
+        while t < target:
+            next_switch = switch_times[segment + 1] if segment + 1 < len(switch_times) else np.inf
+            end = min(next_switch, target)
+            rho = propagator(values[segment], end - t) @ rho
+            t = end
+            if end == next_switch:
+                segment += 1
+        rho_t[j] = rho.reshape(d, d)
+    return rho_t
+
+# Ensemble solver
+# R noise realisations are evolved together as one (R, d^2) stack of vectorised density
+# matrices. On every grid step each realisation gets the propagator for its own noise value,
+# gathered from a table of the distinct (f, dt) pairs, and one batched matmul advances all of
+# them. Continuous noise (method="fft") has a distinct value per realisation and step, so a
+# table would need R*T matrix exponentials; with more than MAX_PROPAGATOR_TABLE distinct pairs
+# each step is instead applied to the vectors directly by taylor_propagate.
+# Realisations are split into chunks seeded from SeedSequence([seed, chunk]), so the
+# result does not depend on how chunks are spread over worker processes.
+MAX_PROPAGATOR_TABLE = 4096
+
+def taylor_propagate(rho, L0T, L1T, f, dt, norm_bound, tol=1e-15):
+    # exp((L0 + f_r L1) dt) rho_r for every row r of rho, summing the Taylor series on the
+    # vectors; dt is split into substeps with ||(L0 + f L1) h|| <= 1 so the series converges fast
+    substeps = max(1, int(np.ceil(norm_bound * dt)))
+    h = dt / substeps
+    for _ in range(substeps):
+        term, k = rho, 1
+        while True:
+            term = (term @ L0T + f[:, None] * (term @ L1T)) * (h / k)
+            rho = rho + term
+            if np.abs(term).max() <= tol * np.abs(rho).max():
+                break
+            k += 1
+    return rho
+
+def ensemble_populations(rho0, L0, L1, fluctuators, time_grid, propagator=None):
+    # fluctuators: (R, len(time_grid)) grid noise, one row per realisation.
+    # Returns populations of shape (len(time_grid), R, d).
+    num_realisations, d = fluctuators.shape[0], rho0.shape[0]
+    # the noise held on (t_j, t_j+1] is fluctuators[:, j+1], as in grid_trace
+    dts = np.round(np.diff(time_grid), 12)
+    pairs = np.stack(np.broadcast_arrays(fluctuators[:, 1:], dts), axis=-1).reshape(-1, 2)
+    keys, index = np.unique(pairs, axis=0, return_inverse=True)
+    if len(keys) <= MAX_PROPAGATOR_TABLE:
+        propagator = propagator or propagator_cache(L0, L1)
+        table = np.stack([propagator(f, dt) for f, dt in keys])
+        index = index.reshape(num_realisations, len(dts))
+        step = lambda rho, j: np.einsum('rij,rj->ri', table[index[:, j]], rho)
+    else:
+        L0 = L0.toarray() if sp.issparse(L0) else L0
+        L1 = L1.toarray() if sp.issparse(L1) else L1
+        norm_bound = np.linalg.norm(L0, 1) + np.abs(fluctuators).max() * np.linalg.norm(L1, 1)
+        step = lambda rho, j: taylor_propagate(rho, L0.T, L1.T, fluctuators[:, j + 1], dts[j], norm_bound)
+
+    diagonal = np.arange(d) * (d + 1)
+    rho = np.tile(rho0.flatten().astype(complex), (num_realisations, 1))
+    populations = np.empty((len(time_grid), num_realisations, d))
+    populations[0] = rho[:, diagonal].real
+    for j in range(len(dts)):
+        rho = step(rho, j)
+        populations[j + 1] = rho[:, diagonal].real
+    return populations
+
+def ensemble_chunk(rho0, L0, L1, time_grid, num_realisations, noise_kwargs, seed, chunk):
+    rng = np.random.default_rng(np.random.SeedSequence([seed, chunk]))
+    fluctuators = np.stack([generate_fluctuators(time_grid, rng=rng, **noise_kwargs)
+                            for _ in range(num_realisations)])
+    return ensemble_populations(rho0, L0, L1, fluctuators, time_grid)
+
+def run_ensemble(rho0, L0, L1, time_grid, num_realisations, noise_kwargs, chunk_size=50, workers=None, seed=0, z=1.96):
+    # noise_kwargs are passed to generate_fluctuators (num_fluctuators, gamma_min, gamma_max, ...).
+    # Returns mean populations and the lower/upper z-sigma confidence band of the mean,
+    # each of shape (d, len(time_grid)); workers=1 runs in this process.
+    sizes = [min(chunk_size, num_realisations - start) for start in range(0, num_realisations, chunk_size)]
+    args = [(rho0, L0, L1, time_grid, size, noise_kwargs, seed, chunk) for chunk, size in enumerate(sizes)]
+    if workers == 1 or len(sizes) == 1:
+        results = [ensemble_chunk(*a) for a in args]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(ensemble_chunk, *zip(*args)))
+    populations = np.concatenate(results, axis=1)  # (num_points, R, d)
+    mean = populations.mean(axis=1).T
+    halfwidth = z * populations.std(axis=1).T / np.sqrt(num_realisations)
+    return mean, mean - halfwidth, mean + halfwidth
+
+if __name__ == "__main__":
+    # Initialization
+    eigvals, eigvecs = transmon_hamiltonian(EC, EJ, n_max)
+    H_sys = np.diag(eigvals)
+    Ax = charge_operator(eigvecs, n_max)
+    Az = cos_phi_operator(eigvecs, n_max)
+    L0, L1 = liouvillian(H_sys, Ax, Az, gx, gz, b)
+
+    # Initial state: |1> state
+    rho0 = np.zeros((num_levels, num_levels), dtype=complex)
+    rho0[1, 1] = 1.0
+
+    # Time evolution setup
+    t_max = 2  # total simulation time (2 µs)
+    num_points = 500
+    time_grid = np.linspace(0, t_max, num_points)
+
+    # Average over noise realisations (1 for a single trajectory)
+    num_realisations = 200
+    workers = None  # processes for the ensemble, 1 to run in this process
+
+    if num_realisations > 1:
+        noise_kwargs = dict(num_fluctuators=num_fluctuators, gamma_min=gamma_min, gamma_max=gamma_max)
+        populations, lower, upper = run_ensemble(rho0, L0, L1, time_grid, num_realisations, noise_kwargs,
+                                                 workers=workers)
+    else:
+        # Generate fluctuators
+        fluctuators = generate_fluctuators(time_grid, num_fluctuators, gamma_min, gamma_max)
+
+        # Solve master equation, either with exact propagators between noise switches ("propagator")
+        # or by integrating through the discontinuities with RK45 ("rk45")
+        solver = "propagator"
+        if solver == "propagator":
+            switch_times, values = grid_trace(time_grid, fluctuators)
+            rho_t = evolve_piecewise(rho0, L0, L1, switch_times, values, time_grid)
+        else:
+            sol = integrate.solve_ivp(
+                master_equation,
+                [0, t_max],
+                rho0.flatten(),
+                args=(L0, L1, fluctuators, time_grid),
+                t_eval=time_grid,
+                method='RK45'
+            )
+            rho_t = sol.y.T.reshape(-1, num_levels, num_levels)  # shape: (num_points, num_levels, num_levels)
+
+        # Extract populations
+        populations = np.real(np.diagonal(rho_t, axis1=1, axis2=2))  # shape: (num_points, num_levels)
+        populations = populations.T  # shape: (num_levels, num_points)
+        lower = upper = populations
+
+    # Plot population dynamics
+    plt.figure(figsize=(8,5))
+    for i in range(num_levels):
+        plt.plot(time_grid*1e6, populations[i], label=f'Level {i}')
+        plt.fill_between(time_grid*1e6, lower[i], upper[i], alpha=0.3)
+    plt.xlabel('Time (µs)')
+    plt.ylabel('Population')
+    plt.title(f'Transmon Qubit State Dynamics with Noise ({num_realisations} realisations)')
+    plt.legend()
+    plt.grid(True)
+    plt.tight_layout()
+    plt.show()
@@ -16,39 +16,183 @@ def commutator(A, B):
 def anticommutator(A, B):
     return A @ B + B @ A
 
+# Real views of complex states, for integrators that need real tensors: interleaved
+# (real, imag) pairs via view_as_real / view_as_complex, so neither direction copies.
+# The simulator itself integrates the complex state directly.
 def flatten_complex_matrix(matrix):
-    matrix = matrix.flatten()
-    return torch.cat([matrix.real, matrix.imag])
+    return torch.view_as_real(matrix.contiguous()).reshape(-1)
 
 def reconstruct_matrix_from_array(array, shape):
-    half_len = array.numel() // 2
-    real = array[:half_len].reshape(*shape)
-    imag = array[half_len:].reshape(*shape)
-    return real + 1j * imag
+    return torch.view_as_complex(array.reshape(*shape, 2))
+
+# Operator terms
+# The Hamiltonian and every Lindblad operator may be given as a constant tensor, as an
+# (operator, coefficient function) pair meaning coeff(t) * operator, or as a legacy callable
+# L(t). Constant terms and the operators of pairs are compiled once into the effective
+# non-Hermitian Hamiltonian H_eff = H - i/2 sum L^dag L and a stack of jump operators, or,
+# for small Hilbert spaces, into d^2 x d^2 superoperators; per step only the scalar
+# coefficients are evaluated. Legacy callables are still called at every step.
+SUPEROPERATOR_MAX_DIM = 16
+
+def is_coefficient_pair(term):
+    return isinstance(term, tuple) and len(term) == 2 and torch.is_tensor(term[0]) and callable(term[1])
+
+def split_terms(terms):
+    # -> (constant tensors, (operator, coefficient) pairs, legacy callables)
+    if torch.is_tensor(terms) or callable(terms) or is_coefficient_pair(terms):
+        terms = [terms]
+    constant, pairs, legacy = [], [], []
+    for term in terms:
+        if torch.is_tensor(term):
+            constant.append(term)
+        elif is_coefficient_pair(term):
+            pairs.append(term)
+        elif callable(term):
+            legacy.append(term)
+        else:
+            raise TypeError(f"Unsupported operator term: {term!r}")
+    return constant, pairs, legacy
+
+def heff_superoperator(H_eff):
+    # vec(-i (H_eff rho - rho H_eff^dag)) for row-major vec
+    identity = torch.eye(H_eff.shape[0], dtype=H_eff.dtype, device=H_eff.device)
+    return -1j * (torch.kron(H_eff, identity) - torch.kron(identity, H_eff.conj()))
+
+def jump_superoperator(L):
+    # vec(L rho L^dag)
+    return torch.kron(L, L.conj())
+
+def observable_stack(observables, dim, dtype, device):
+    # Observables as one (K, d, d) tensor; the element (i, j) is read out as Tr(|j><i| rho)
+    ops = []
+    for O in observables:
+        if isinstance(O, tuple):
+            i, j = O
+            O = torch.zeros((dim, dim), dtype=dtype)
+            O[j, i] = 1
+        ops.append(torch.as_tensor(O, dtype=dtype))
+    return torch.stack(ops).to(device) if ops else torch.zeros((0, dim, dim), dtype=dtype, device=device)
 
 class LindbladSimulator:
-    def __init__(self, hamiltonian_func, lindblad_operators, device='cpu'):
+    def __init__(self, hamiltonian_func, lindblad_operators, device='cpu', superoperator=None):
+        # superoperator=None uses the d^2 x d^2 form up to SUPEROPERATOR_MAX_DIM
         self.H = hamiltonian_func
         self.L_ops = lindblad_operators
         self.device = device
-
-    def evolve(self, rho0, times):
-        rho0 = rho0.to(self.device)
-        rho0_vec = flatten_complex_matrix(rho0)
-
-        def master_eq(t, rho_vec):
-            rho = reconstruct_matrix_from_array(rho_vec, rho0.shape)
-            Ht = self.H(t)
-            L_ops_t = [L(t) for L in self.L_ops]
+        self.superoperator = superoperator
+
+    def compile(self, dim, dtype=torch.cfloat):
+        to = lambda op: op.to(device=self.device, dtype=dtype)
+        H_const, H_pairs, self.legacy_H = split_terms(self.H)
+        L_const, L_pairs, self.legacy_L = split_terms(self.L_ops)
+        zero = torch.zeros((dim, dim), dtype=dtype, device=self.device)
+
+        # Term k > 0 is scaled by coefficient k: f(t) for Hamiltonian pairs, |g(t)|^2 for
+        # Lindblad pairs g(t) L; term 0 (all constant parts) by 1
+        self.coefficient_fns = [f for _, f in H_pairs] + [lambda t, g=g: abs(g(t))**2 for _, g in L_pairs]
+        H_eff = sum((to(H) for H in H_const), zero) - 0.5j * sum((to(L).conj().T @ to(L) for L in L_const), zero)
+        heff_terms = [H_eff] + [to(H) for H, _ in H_pairs] + [-0.5j * to(L).conj().T @ to(L) for L, _ in L_pairs]
+        self.jumps = torch.stack([to(L) for L in L_const] + [to(L) for L, _ in L_pairs]) if L_const or L_pairs else None
+        self.num_constant_jumps = len(L_const)
+
+        self.use_superoperator = self.superoperator if self.superoperator is not None else dim <= SUPEROPERATOR_MAX_DIM
+        if self.use_superoperator:
+            pair_jumps = [zero] * len(H_pairs) + [to(L) for L, _ in L_pairs]
+            supers = [heff_superoperator(H) for H in heff_terms]
+            supers[0] = supers[0] + sum((jump_superoperator(to(L)) for L in L_const), torch.zeros_like(supers[0]))
+            for k, L in enumerate(pair_jumps, start=1):
+                supers[k] = supers[k] + jump_superoperator(L)
+            self.generators = torch.stack(supers)
+        else:
+            self.generators = torch.stack(heff_terms)
+
+    def coefficients(self, t):
+        values = [1.0] + [complex(fn(t)) for fn in self.coefficient_fns]
+        return torch.tensor(values, dtype=self.generators.dtype, device=self.device)
+
+    def generator(self, t, rho):
+        # d rho / dt for a (d, d) density matrix or a (..., d, d) batch sharing the generator
+        d = rho.shape[-1]
+        if self.coefficient_fns:
+            c = self.coefficients(t)
+            compiled = torch.tensordot(c, self.generators, dims=1)
+        else:
+            c, compiled = None, self.generators[0]
+        if self.use_superoperator:
+            drho = (rho.reshape(-1, d * d) @ compiled.T).reshape(rho.shape)
+        else:
+            drho = -1j * (compiled @ rho - rho @ compiled.conj().T)
+            if self.jumps is not None:
+                weights = torch.ones(len(self.jumps), dtype=rho.dtype, device=self.device)
+                if c is not None and len(self.jumps) > self.num_constant_jumps:
+                    weights[self.num_constant_jumps:] = c[len(c) - (len(self.jumps) - self.num_constant_jumps):]
+                jumps = self.jumps.reshape(len(self.jumps), *([1] * (rho.dim() - 2)), d, d)
+                drho = drho + torch.einsum('k,k...ij->...ij', weights, jumps @ rho @ jumps.conj().transpose(-1, -2))
+
+        if self.legacy_H or self.legacy_L:
+            for H in self.legacy_H:
+                drho = drho - 1j * commutator(H(t), rho)
+            L_ops_t = [L(t) for L in self.legacy_L]
             L_dags = [L.conj().T for L in L_ops_t]
-
-            dissipator = sum(L @ rho @ L_dag for L, L_dag in zip(L_ops_t, L_dags))
-            anti = sum(L_dag @ L for L, L_dag in zip(L_ops_t, L_dags))
-            drho = -1j * commutator(Ht, rho) + dissipator - 0.5 * anticommutator(anti, rho)
-            return flatten_complex_matrix(drho)
-
-        result = odeint(master_eq, rho0_vec, times.to(self.device))
-        return [reconstruct_matrix_from_array(r, rho0.shape).cpu() for r in result]
+            if L_ops_t:
+                dissipator = sum(L @ rho @ L_dag for L, L_dag in zip(L_ops_t, L_dags))
+                anti = sum(L_dag @ L for L, L_dag in zip(L_ops_t, L_dags))
+                drho = drho + dissipator - 0.5 * anticommutator(anti, rho)
+        return drho
+
+    def evolve(self, rho0, times, observables=None, callback=None, decimate=1, store_states=False,
+               chunk_size=1000):
+        # rho0 is one (d, d) density matrix or a (B, d, d) batch, integrated in one odeint call.
+        # The complex state is integrated as is, so the RHS does no repacking, and the
+        # trajectory comes back as one (len(times), ...) complex tensor.
+        #
+        # With observables (tensors O, or (i, j) tuples for rho[i, j]) and/or a callback, only
+        # the expectation values Tr(O rho) at times[::decimate] are kept: the integration runs
+        # over blocks of chunk_size output times, each block's states are reduced to values
+        # and callback(t, values, rho) is called, then the states are dropped. Returns
+        # (values of shape (T_kept, ..., K), states), states only if store_states is set.
+        rho0 = rho0.to(self.device)
+        self.compile(rho0.shape[-1], rho0.dtype)
+        times = times.to(self.device)
+        if observables is None and callback is None:
+            return odeint(self.generator, rho0, times).cpu()
+
+        kept = times[::decimate]
+        ops = observable_stack(observables or [], rho0.shape[-1], rho0.dtype, self.device)
+        values = torch.empty((len(kept),) + rho0.shape[:-2] + (len(ops),), dtype=rho0.dtype)
+        states = torch.empty((len(kept),) + rho0.shape, dtype=rho0.dtype) if store_states else None
+        values[0] = torch.einsum('kij,...ji->...k', ops, rho0).cpu()
+        if states is not None:
+            states[0] = rho0.cpu()
+        if callback is not None:
+            callback(kept[0], values[0], rho0)
+        rho = rho0
+        for start in range(1, len(kept), chunk_size):
+            # each block restarts from the last state of the previous one
+            block = kept[start - 1:start + chunk_size]
+            trajectory = odeint(self.generator, rho, block)[1:]
+            block_values = torch.einsum('kij,t...ji->t...k', ops, trajectory)
+            values[start:start + len(trajectory)] = block_values.cpu()
+            if states is not None:
+                states[start:start + len(trajectory)] = trajectory.cpu()
+            if callback is not None:
+                for t, v, r in zip(block[1:], block_values, trajectory):
+                    callback(t, v, r)
+            rho = trajectory[-1]
+        return values, states
+
+    def process_matrix(self, times, dim, representation="superoperator"):
+        # The channel rho(0) -> rho(t) at every time, from the d^2 basis inputs |i><j| evolved
+        # as one batch. "superoperator": S with vec(rho(t)) = S vec(rho(0)), row-major vec.
+        # "choi": sum_ij |i><j| kron Phi(|i><j|). Both of shape (len(times), d^2, d^2).
+        basis = torch.eye(dim * dim, dtype=torch.cfloat).reshape(dim * dim, dim, dim)
+        outputs = self.evolve(basis, times)  # (T, d^2, d, d), input index k = i*d + j
+        if representation == "superoperator":
+            return outputs.reshape(len(times), dim * dim, dim * dim).transpose(-1, -2)
+        if representation == "choi":
+            choi = outputs.reshape(len(times), dim, dim, dim, dim).permute(0, 1, 3, 2, 4)
+            return choi.reshape(len(times), dim * dim, dim * dim)
+        raise ValueError(f"Unknown process representation: {representation}")
 
 if __name__ == '__main__':
     device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
@@ -62,10 +206,11 @@ if __name__ == '__main__':
 
     rho0 = psi0 @ psi0.T.conj()
 
-    # Time-independent operators
-    H = lambda t: 0.5 * SIGMA_Z.to(device)
-    L1 = lambda t: torch.sqrt(torch.tensor(0.5)) * SIGMA_M.to(device)
-    L2 = lambda t: torch.sqrt(torch.tensor(0.3)) * SIGMA_Z.to(device)
+    # Time-independent operators, compiled once; time-dependent terms can be given as
+    # (operator, coefficient function) pairs, e.g. (SIGMA_X, lambda t: torch.cos(t))
+    H = 0.5 * SIGMA_Z
+    L1 = torch.sqrt(torch.tensor(0.5)) * SIGMA_M
+    L2 = torch.sqrt(torch.tensor(0.3)) * SIGMA_Z
 
     sim = LindbladSimulator(H, [L1, L2], device)
 
@@ -74,16 +219,17 @@ if __name__ == '__main__':
     steps = 1000
     times = torch.linspace(t0, tf, steps)
 
+    # Only the plotted elements are kept, not the full density matrices
     start = time.time()
-    evolution = sim.evolve(rho0, times)
+    values, _ = sim.evolve(rho0, times, observables=[(0, 0), (1, 1), (0, 1)])
     end = time.time()
     print(f"Simulation time: {end - start:.2f} seconds")
 
     # Plot populations and coherences
-    rho_00 = [r[0, 0].real for r in evolution]
-    rho_11 = [r[1, 1].real for r in evolution]
-    rho_01_re = [r[0, 1].real for r in evolution]
-    rho_01_im = [r[0, 1].imag for r in evolution]
+    rho_00 = values[:, 0].real
+    rho_11 = values[:, 1].real
+    rho_01_re = values[:, 2].real
+    rho_01_im = values[:, 2].imag
 
     times_np = times.numpy()
 
@@ -17,55 +17,222 @@ def commute(A, B):
 def anticommute(A, B):
     return A @ B + B @ A
 
+# Dormand-Prince 5(4) tableau: nodes, stage coefficients, 5th-order weights and the
+# difference between the 5th- and 4th-order weights used as the error estimate
+DOPRI_C = [0, 1/5, 3/10, 4/5, 8/9, 1]
+DOPRI_A = [
+    [1/5],
+    [3/40, 9/40],
+    [44/45, -56/15, 32/9],
+    [19372/6561, -25360/2187, 64448/6561, -212/729],
+    [9017/3168, -355/33, 46732/5247, 49/176, -5103/18656],
+]
+DOPRI_B5 = [35/384, 0, 500/1113, 125/192, -2187/6784, 11/84]
+DOPRI_B4 = [5179/57600, 0, 7571/16695, 393/640, -92097/339200, 187/2100, 1/40]
+DOPRI_E = [b5 - b4 for b5, b4 in zip(DOPRI_B5 + [0], DOPRI_B4)]
+# Shampine's 4th-order dense output: row j gives the weight of stage j (the 7th being the FSAL
+# derivative) as a polynomial in theta, coefficients of theta, theta^2, theta^3, theta^4
+DOPRI_P = [
+    [1, -8048581381/2820520608, 8663915743/2820520608, -12715105075/11282082432],
+    [0, 0, 0, 0],
+    [0, 131558114200/32700410799, -68118460800/10900136933, 87487479700/32700410799],
+    [0, -1754552775/470086768, 14199869525/1410260304, -10690763975/1880347072],
+    [0, 127303824393/49829197408, -318862633887/49829197408, 701980252875/199316789632],
+    [0, -282668133/205662961, 2019193451/616988883, -1453857185/822651844],
+    [0, 40617522/29380423, -110615467/29380423, 69997945/29380423],
+]
+
+def hermite(y0, f0, y1, f1, h, theta):
+    # Cubic Hermite interpolant at t0 + theta*h from the values and derivatives at both ends
+    return ((2*theta**3 - 3*theta**2 + 1) * y0 + (theta**3 - 2*theta**2 + theta) * h * f0
+            + (-2*theta**3 + 3*theta**2) * y1 + (theta**3 - theta**2) * h * f1)
+
+def dopri5_dense(y0, stages, h, theta):
+    # Dormand-Prince interpolant at t0 + theta*h from the seven stages of the step
+    weights = [sum(p * theta**(i + 1) for i, p in enumerate(row)) for row in DOPRI_P]
+    return y0 + h * sum(w * k for w, k in zip(weights, stages) if w)
+
+def observable_stack(observables, dim, dtype, device):
+    # (K, d, d) stack for batched Tr(O rho); an (i, j) index is the observable |j><i|,
+    # whose expectation value is rho[i, j]
+    ops = []
+    for O in observables:
+        if isinstance(O, tuple):
+            i, j = O
+            O = torch.zeros((dim, dim), dtype=dtype)
+            O[j, i] = 1
+        ops.append(torch.as_tensor(O, dtype=dtype))
+    return torch.stack(ops).to(device) if ops else torch.zeros((0, dim, dim), dtype=dtype, device=device)
+
 class OpenQuantumSolver:
     def __init__ (self, Hamiltonian, Lindbladians, device='cpu'):
         self.H = Hamiltonian
         self.L = Lindbladians
         self.device = device
 
+    # MatToVec / MatFlat are views (view_as_complex / view_as_real of interleaved real and
+    # imaginary parts), so converting between the two representations never copies
     def MatToVec(self, vec, shape):
-        l=vec.numel() // 2
-        RealPart=vec[:l].reshape(*shape)
-        ImagPart=vec[l:].reshape(*shape)
-        return RealPart + 1j * ImagPart
-    
+        return torch.view_as_complex(vec.reshape(*shape, 2))
+
     def MatFlat(self, matrix):
-        matrix = matrix.flatten()
-        return torch.cat([matrix.real, matrix.imag])
-    
-    def LindbladRHS(self, t, rho_vec):
-        rho = self.MatToVec(rho_vec, self.rho0.shape)
+        return torch.view_as_real(matrix.contiguous()).reshape(-1)
+
+    def rhs(self, t, rho):
         Ht = self.H(t)
         L_ops_t = [L(t) for L in self.L]
         L_dags = [L.conj().T for L in L_ops_t]
 
         dissipator = sum(L @ rho @ L_dag for L, L_dag in zip(L_ops_t, L_dags))
         anti = sum(L_dag @ L for L, L_dag in zip(L_ops_t, L_dags))
-        drho = -1j * commute(Ht, rho) + dissipator - 0.5 * anticommute(anti, rho)
-        return self.MatFlat(drho)
-    
-    def EvoRho(self, rho0, times):
+        return -1j * commute(Ht, rho) + dissipator - 0.5 * anticommute(anti, rho)
+
+    def LindbladRHS(self, t, rho_vec):
+        return self.MatFlat(self.rhs(t, self.MatToVec(rho_vec, self.rho0.shape)))
+
+    def liouvillian(self, t):
+        # (d^2, d^2) generator at time t for row-major vec(rho): vec(A rho B) = (A kron B^T) vec(rho)
+        Ht = self.H(t)
+        I = torch.eye(Ht.shape[0], dtype=Ht.dtype, device=Ht.device)
+        generator = -1j * (torch.kron(Ht, I) - torch.kron(I, Ht.T.contiguous()))
+        for L in (L(t) for L in self.L):
+            LdL = L.conj().T @ L
+            generator = generator + torch.kron(L, L.conj()) - 0.5 * (torch.kron(LdL, I) + torch.kron(I, LdL.T.contiguous()))
+        return generator
+
+    def EvoRho(self, rho0, times, method="euler", dt=None, rtol=1e-6, atol=1e-8,
+               observables=None, callback=None, decimate=1, store_states=False):
+        # Trajectory on `times` as one preallocated (T, d, d) tensor.
+        #   euler:  forward Euler on the times grid
+        #   rk4:    classical Runge-Kutta with fixed step dt (default: the grid spacing)
+        #   dopri5: adaptive Dormand-Prince 5(4) with error control; dt is the first trial step
+        #   magnus: exponential integrator, expm of the Liouvillian at each step midpoint
+        #           (second-order Magnus, exact for a time-independent generator)
+        # Inside each step rk4 fills the grid by cubic Hermite interpolation, dopri5 by its own
+        # 4th-order dense output (so output points meet the same tolerance as the steps) and
+        # magnus by a partial exponential step; the step size is independent of the sampling.
+        #
+        # Streaming mode (observables and/or callback given): states are not kept. At every
+        # `decimate`-th time, Tr(O rho) is evaluated for all observables at once (an (i, j)
+        # tuple selects rho[i, j]) and callback(t, values, rho) is called. Returns
+        # (values of shape (T_kept, K), states) with states (T_kept, d, d) only if store_states.
         self.rho0 = rho0.to(self.device)
-        rho0_vec = self.MatFlat(rho0)
-        rho_t = [rho0_vec]
-        dt = times[1] - times[0]
-        for t in times[:-1]:
-            drho = torch.tensor(self.LindbladRHS(t, rho_t[-1]), device=self.device)
-            rho_t.append(rho_t[-1] + drho * dt)
-        return [self.MatToVec(rho, rho0.shape).cpu() for rho in rho_t]
-    
+        times = np.asarray(times, dtype=float)
+        if observables is None and callback is None:
+            rho_t = torch.empty((len(times),) + tuple(rho0.shape), dtype=self.rho0.dtype, device=self.device)
+
+            def record(index, rho):
+                rho_t[index] = rho
+        else:
+            ops = observable_stack(observables or [], rho0.shape[-1], self.rho0.dtype, self.device)
+            num_kept = len(range(0, len(times), decimate))
+            values = torch.empty((num_kept, len(ops)), dtype=self.rho0.dtype, device=self.device)
+            states = torch.empty((num_kept,) + tuple(rho0.shape), dtype=self.rho0.dtype,
+                                 device=self.device) if store_states else None
+
+            def record(index, rho):
+                if index % decimate:
+                    return
+                k = index // decimate
+                values[k] = torch.einsum('kij,ji->k', ops, rho)
+                if states is not None:
+                    states[k] = rho
+                if callback is not None:
+                    callback(times[index], values[k], rho)
+
+        record(0, self.rho0)
+        if method == "euler":
+            dt = times[1] - times[0]
+            rho = self.rho0
+            for k, t in enumerate(times[:-1]):
+                rho = rho + self.rhs(t, rho) * dt
+                record(k + 1, rho)
+        elif method in ("rk4", "dopri5"):
+            self.integrate_runge_kutta(self.rho0, times, record, method, dt, rtol, atol)
+        elif method == "magnus":
+            self.integrate_magnus(self.rho0, times, record, dt)
+        else:
+            raise ValueError(f"Unknown integration method: {method}")
+        if observables is None and callback is None:
+            return rho_t.cpu()
+        return values.cpu(), states.cpu() if states is not None else None
+
+    def rk4_step(self, t, rho, f0, h):
+        k2 = self.rhs(t + h / 2, rho + h / 2 * f0)
+        k3 = self.rhs(t + h / 2, rho + h / 2 * k2)
+        k4 = self.rhs(t + h, rho + h * k3)
+        rho_new = rho + h / 6 * (f0 + 2 * k2 + 2 * k3 + k4)
+        return rho_new, self.rhs(t + h, rho_new), None, None
+
+    def dopri5_step(self, t, rho, f0, h):
+        k = [f0]
+        for c, a in zip(DOPRI_C[1:], DOPRI_A):
+            k.append(self.rhs(t + c * h, rho + h * sum(a_j * k_j for a_j, k_j in zip(a, k))))
+        rho_new = rho + h * sum(b * k_j for b, k_j in zip(DOPRI_B5, k))
+        # the derivative at the new point is the 7th stage (FSAL) and the next step's f0
+        k.append(self.rhs(t + h, rho_new))
+        error = h * sum(e * k_j for e, k_j in zip(DOPRI_E, k))
+        return rho_new, k[-1], error, k
+
+    # The integrators pass every output point to record(index, rho)
+    def integrate_runge_kutta(self, rho0, times, record, method, dt, rtol, atol):
+        step = self.rk4_step if method == "rk4" else self.dopri5_step
+        t, rho = times[0], rho0
+        f = self.rhs(t, rho)
+        h = dt or (times[1] - times[0] if method == "rk4" else (times[-1] - times[0]) / 100)
+        out = 1
+        while out < len(times):
+            last = h >= times[-1] - t
+            h_step = times[-1] - t if last else h
+            rho_new, f_new, error, stages = step(t, rho, f, h_step)
+            if error is not None:
+                scale = atol + rtol * torch.maximum(rho.abs(), rho_new.abs())
+                norm = torch.sqrt(torch.mean((error.abs() / scale)**2)).item()
+                h = h_step * min(5.0, max(0.2, 0.9 * norm**-0.2)) if norm > 0 else 5 * h_step
+                if norm > 1:
+                    continue  # rejected, retry with the smaller step
+            t_new = times[-1] if last else t + h_step
+            while out < len(times) and times[out] <= t_new:
+                theta = (times[out] - t) / h_step
+                if stages is None:
+                    record(out, hermite(rho, f, rho_new, f_new, h_step, theta))
+                else:
+                    record(out, dopri5_dense(rho, stages, h_step, theta))
+                out += 1
+            t, rho, f = t_new, rho_new, f_new
+
+    def integrate_magnus(self, rho0, times, record, dt):
+        d = rho0.shape[-1]
+        rho = rho0.reshape(d * d)
+        h = dt or times[1] - times[0]
+        t, out = times[0], 1
+        while out < len(times):
+            # never step past the next output time, and do not leave a sliver step before it
+            t_next = times[out] if t + h >= times[out] - 1e-9 * h else t + h
+            rho = torch.matrix_exp(self.liouvillian(0.5 * (t + t_next)) * (t_next - t)) @ rho
+            t = t_next
+            if t == times[out]:
+                record(out, rho.reshape(d, d))
+                out += 1
+
     def plot_rho(self, rho_t, times):
-        fig, axes = plt.subplots(2, 2, figsize=(10, 8))
-        for i in range(2):
-            for j in range(2):
-                axes[i, j].plot(times, [rho[i, j].item() for rho in rho_t], label=f'rho[{i},{j}]')
+        # rho_t: (T, d, d) trajectory (or a list of matrices); real and imaginary parts per element
+        rho_t = torch.stack(list(rho_t)) if isinstance(rho_t, (list, tuple)) else rho_t
+        d = rho_t.shape[-1]
+        fig, axes = plt.subplots(d, d, figsize=(5 * d, 4 * d), squeeze=False)
+        for i in range(d):
+            for j in range(d):
+                element = rho_t[:, i, j].cpu()
+                axes[i, j].plot(times, element.real.numpy(), label=f'Re rho[{i},{j}]')
+                if i != j:
+                    axes[i, j].plot(times, element.imag.numpy(), label=f'Im rho[{i},{j}]')
                 axes[i, j].set_xlabel('Time')
                 axes[i, j].set_ylabel(f'rho[{i},{j}]')
                 axes[i, j].legend()
         plt.tight_layout()
         plt.show()
         return fig, axes
-    
+
 def main():
     # Define Hamiltonian and Lindbladians
     H = lambda t: -0.5 * SIG_Z
@@ -82,7 +249,7 @@ def main():
     # Create solver and compute evolution
     solver = OpenQuantumSolver(H, L)
     start_time = time.time()
-    rho_t = solver.EvoRho(rho0, times)
+    rho_t = solver.EvoRho(rho0, times, method="dopri5")
     end_time = time.time()
     print(f"Execution time: {end_time - start_time} seconds")
 